@@ -4,7 +4,9 @@ from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_migrate import Migrate
 from config import config
+import importlib
 import os
+import time
 
 db = SQLAlchemy()
 jwt = JWTManager()
@@ -51,30 +53,59 @@ def create_app(config_name='development'):
     else:
         CORS(app, origins=os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(','))
 
-    # Register blueprints
-    from app.routes.auth import auth_bp
-    from app.routes.users import users_bp
-    # face routes depend on native dlib/face-recognition libs which may not be
-    # available in all dev environments. Import defensively so the app can
-    # start without those native deps when needed.
-    try:
-        from app.routes.face import face_bp
-    except Exception as e:
-        app.logger.warning('Face routes disabled: %s', str(e))
-        face_bp = None
-    from app.routes.attendance import attendance_bp
-    from app.routes.statistics import statistics_bp
-    from app.routes.admin import admin_bp
-    from app.routes.health import health_bp
-
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(users_bp)
-    if face_bp:
-        app.register_blueprint(face_bp)
-    app.register_blueprint(attendance_bp)
-    app.register_blueprint(statistics_bp)
-    app.register_blueprint(admin_bp)
-    app.register_blueprint(health_bp)
+    # Register blueprints, timing each import so slow start-up can be traced
+    # to a blueprint. Modules shared by several blueprints are charged to the
+    # first one that imports them.
+    startup_timings = app.extensions.setdefault('startup_timings', {})
+    blueprint_modules = [
+        ('auth', 'auth_bp'),
+        ('users', 'users_bp'),
+        ('face', 'face_bp'),
+        ('attendance', 'attendance_bp'),
+        ('statistics', 'statistics_bp'),
+        ('admin', 'admin_bp'),
+        ('health', 'health_bp'),
+    ]
+    for module_name, blueprint_name in blueprint_modules:
+        start = time.perf_counter()
+        module = importlib.import_module(f'app.routes.{module_name}')
+        startup_timings[f'blueprint.{module_name}'] = round((time.perf_counter() - start) * 1000, 1)
+        app.register_blueprint(getattr(module, blueprint_name))
+
+    # face_recognition is imported lazily, so the face routes always register;
+    # without its native dlib libs the endpoints that run the models answer 503
+    from app.services.face_pipeline import face_recognition_available
+    app.config['FACE_RECOGNITION_AVAILABLE'] = face_recognition_available()
+    if not app.config['FACE_RECOGNITION_AVAILABLE']:
+        app.logger.warning('face_recognition is not installed; face enrollment and recognition are disabled')
+
+    # A batch request may not take more images than the face worker pool
+    # can hold at once
+    from app.services.face_worker import face_worker
+    if face_worker.processes > 0 and app.config['FACE_BATCH_MAX_IMAGES'] > face_worker.capacity:
+        app.logger.warning('FACE_BATCH_MAX_IMAGES=%s exceeds the face worker capacity (%s); using %s',
+                           app.config['FACE_BATCH_MAX_IMAGES'], face_worker.capacity, face_worker.capacity)
+        app.config['FACE_BATCH_MAX_IMAGES'] = face_worker.capacity
+
+    if app.config.get('FACE_MODELS_PRELOAD') == 'eager':
+        from app.services.face_pipeline import load_face_models
+        start = time.perf_counter()
+        if load_face_models():
+            startup_timings['face_models'] = round((time.perf_counter() - start) * 1000, 1)
+        else:
+            app.logger.warning('FACE_MODELS_PRELOAD=eager but face_recognition is not installed')
+
+    app.logger.info('Startup import times (ms): %s', ', '.join(
+        f'{name}={elapsed}' for name, elapsed in startup_timings.items()
+    ))
+
+    # Keep the in-process face gallery in step with FaceEncoding writes made
+    # from any blueprint (registers SQLAlchemy session listeners)
+    from app.services import face_gallery  # noqa: F401
+
+    # flask CLI maintenance commands
+    from app.commands import register_commands
+    register_commands(app)
 
     # Register error handlers
     from app.middleware.error_handler import register_error_handlers
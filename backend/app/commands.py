@@ -0,0 +1,131 @@
+"""
+Maintenance commands for the `flask` CLI.
+
+    FLASK_APP=run.py flask face convert-encodings --dtype float32
+    FLASK_APP=run.py flask attendance mark-absent --date 2024-05-31
+    FLASK_APP=run.py flask attendance rebuild-rollup --start 2024-01-01
+    FLASK_APP=run.py flask reports evict-expired
+
+mark-absent is meant to run once at the end of each working day, e.g. from
+cron: 55 23 * * 1-5  cd /app && FLASK_APP=run.py flask attendance mark-absent
+
+rebuild-rollup backfills attendance_daily_rollup and the per-user
+attendance_monthly_counters, and repairs them after records were changed
+outside AttendanceService (e.g. by hand in SQL).
+"""
+from datetime import date, timedelta
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, select, update
+from app import db
+from app.models.face_encoding import FaceEncoding
+from app.services.attendance_rollup import attendance_date_range, rebuild_monthly_counters, rebuild_rollup
+from app.services.attendance_service import AttendanceService
+from app.services.face_encoding_format import decode_encoding, encode_encoding, encoding_dtype, is_legacy
+from app.services.face_gallery import bump_gallery_version
+from app.services.report_service import ReportService
+from config import Config
+
+face_cli = AppGroup('face', help='Face recognition maintenance.')
+attendance_cli = AppGroup('attendance', help='Attendance maintenance.')
+reports_cli = AppGroup('reports', help='Report file maintenance.')
+
+
+@face_cli.command('convert-encodings')
+@click.option('--dtype', default=None, help='Target storage dtype (default FACE_ENCODING_STORAGE_DTYPE).')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows converted per transaction.')
+def convert_encodings(dtype, batch_size):
+    """Rewrite stored face encodings in the versioned storage format"""
+    dtype = dtype or Config.FACE_ENCODING_STORAGE_DTYPE
+    table = FaceEncoding.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam('row_id'))
+        .values(encoding_vector=bindparam('blob'))
+    )
+
+    converted = skipped = 0
+    last_id = ''
+    while True:
+        # Keyset pagination keeps every batch an index range scan
+        rows = db.session.execute(
+            select(table.c.id, table.c.encoding_vector)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        changes = []
+        for row in rows:
+            blob = row.encoding_vector
+            if not is_legacy(blob) and encoding_dtype(blob).name == dtype:
+                skipped += 1
+                continue
+            changes.append({'row_id': row.id, 'blob': encode_encoding(decode_encoding(blob), dtype)})
+
+        if changes:
+            # executemany; other workers reload their gallery via the version counter
+            db.session.execute(statement, changes)
+            bump_gallery_version(db.session.connection())
+            db.session.commit()
+            converted += len(changes)
+        click.echo(f'{converted} converted, {skipped} already {dtype}')
+
+    click.echo(f'Done: {converted} face encodings converted to {dtype}, {skipped} unchanged')
+
+
+@attendance_cli.command('mark-absent')
+@click.option('--date', 'attendance_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Date to close (YYYY-MM-DD, default today).')
+def mark_absent(attendance_date):
+    """Record ABSENT for every active user with no attendance on a date"""
+    attendance_date = attendance_date.date() if attendance_date else date.today()
+    inserted = AttendanceService().materialize_absences(attendance_date)
+    click.echo(f'{inserted} absent records created for {attendance_date.isoformat()}')
+
+
+@attendance_cli.command('rebuild-rollup')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First date to rebuild (default first attendance record).')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last date to rebuild (default last attendance record).')
+def rebuild_attendance_rollup(start, end):
+    """Recompute the attendance rollup and monthly counters from attendance records"""
+    first, last = attendance_date_range()
+    start = start.date() if start else first
+    end = end.date() if end else last
+    if start is None or end is None:
+        click.echo('No attendance records')
+        return
+
+    # One transaction per calendar month; monthly counters always cover
+    # whole months
+    days = counters = 0
+    batch_start = start
+    while batch_start <= end:
+        batch_end = min((batch_start.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1), end)
+        days += rebuild_rollup(batch_start, batch_end)
+        counters += rebuild_monthly_counters(batch_start, batch_end)
+        db.session.commit()
+        click.echo(f'{batch_start.strftime("%Y-%m")}: {days} rollup rows, {counters} user counters')
+        batch_start = batch_end + timedelta(days=1)
+
+    click.echo(f'Done: rebuilt {start.isoformat()} to {end.isoformat()} '
+               f'({days} rollup rows, {counters} user counters)')
+
+
+@reports_cli.command('evict-expired')
+def evict_expired_reports():
+    """Delete report files past their expires_at (the report worker also does this when idle)"""
+    deleted = ReportService().evict_expired_reports()
+    click.echo(f'{deleted} report files deleted')
+
+
+def register_commands(app):
+    """Attach the CLI command groups to the app"""
+    app.cli.add_command(face_cli)
+    app.cli.add_command(attendance_cli)
+    app.cli.add_command(reports_cli)
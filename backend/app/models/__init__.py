@@ -4,6 +4,7 @@ from app import db
 from .user import User
 from .face_encoding import FaceEncoding
 from .attendance import AttendanceRecord
+from .attendance_rollup import AttendanceDailyRollup, AttendanceMonthlyCounter
 from .settings import UserSettings
 from .department import Department
 from .activity_log import ActivityLog
@@ -16,6 +17,8 @@ __all__ = [
     'User',
     'FaceEncoding',
     'AttendanceRecord',
+    'AttendanceDailyRollup',
+    'AttendanceMonthlyCounter',
     'UserSettings',
     'Department',
     'ActivityLog',
@@ -21,7 +21,7 @@ class VerificationStatus(Enum):
 class AttendanceRecord(db.Model):
     __tablename__ = 'attendance_records'
 
-    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
     user_id = db.Column(db.String(20), db.ForeignKey('users.id'), nullable=False, index=True)
     face_encoding_id = db.Column(db.String(50), db.ForeignKey('face_encodings.id'))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -0,0 +1,56 @@
+from app import db
+from datetime import datetime
+from app.models.attendance import AttendanceStatus
+
+class AttendanceDailyRollup(db.Model):
+    """Attendance record counts per day, department and status"""
+    __tablename__ = 'attendance_daily_rollup'
+
+    date_only = db.Column(db.Date, primary_key=True)
+    # Department of the user when the record was written ('' = no department)
+    department = db.Column(db.String(50), primary_key=True, default='')
+    status = db.Column(db.Enum(AttendanceStatus), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'date': self.date_only.isoformat(),
+            'department': self.department or None,
+            'status': self.status.value,
+            'count': self.count
+        }
+
+
+class AttendanceMonthlyCounter(db.Model):
+    """Attendance record counts per user and month"""
+    __tablename__ = 'attendance_monthly_counters'
+
+    user_id = db.Column(db.String(20), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    # First day of the month
+    month_start = db.Column(db.Date, primary_key=True)
+    total_days = db.Column(db.Integer, nullable=False, default=0)
+    present_days = db.Column(db.Integer, nullable=False, default=0)
+    absent_days = db.Column(db.Integer, nullable=False, default=0)
+    late_days = db.Column(db.Integer, nullable=False, default=0)
+    leave_days = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Counter column per status
+    STATUS_COLUMNS = {
+        AttendanceStatus.PRESENT: 'present_days',
+        AttendanceStatus.ABSENT: 'absent_days',
+        AttendanceStatus.LATE: 'late_days',
+        AttendanceStatus.LEAVE: 'leave_days'
+    }
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'month': self.month_start.strftime('%Y-%m'),
+            'total_days': self.total_days,
+            'present_days': self.present_days,
+            'absent_days': self.absent_days,
+            'late_days': self.late_days,
+            'leave_days': self.leave_days
+        }
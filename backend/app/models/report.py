@@ -4,6 +4,7 @@ from enum import Enum
 
 class ReportStatus(Enum):
     PENDING = 'pending'
+    RUNNING = 'running'
     COMPLETED = 'completed'
     FAILED = 'failed'
 
@@ -11,6 +12,7 @@ class ReportFormat(Enum):
     CSV = 'csv'
     PDF = 'pdf'
     EXCEL = 'excel'
+    PARQUET = 'parquet'
 
 class Report(db.Model):
     __tablename__ = 'reports'
@@ -21,12 +23,17 @@ class Report(db.Model):
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
     filters = db.Column(db.JSON)
+    # SHA-256 of type, normalized period/filters and data watermark (report reuse)
+    cache_key = db.Column(db.String(64), index=True)
     file_path = db.Column(db.String(255))
     file_size = db.Column(db.Integer)
     file_format = db.Column(db.Enum(ReportFormat), nullable=False)
     record_count = db.Column(db.Integer)
     status = db.Column(db.Enum(ReportStatus), default=ReportStatus.PENDING, index=True)
+    # Percent done while RUNNING
+    progress = db.Column(db.Integer, default=0)
     error_message = db.Column(db.Text)
+    started_at = db.Column(db.DateTime)
     generated_at = db.Column(db.DateTime)
     expires_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -39,7 +46,12 @@ class Report(db.Model):
             'title': self.title,
             'file_format': self.file_format.value,
             'status': self.status.value,
+            'progress': self.progress,
             'record_count': self.record_count,
+            'file_size': self.file_size,
+            'error_message': self.error_message,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
             'generated_at': self.generated_at.isoformat() if self.generated_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
             'created_at': self.created_at.isoformat()
         }
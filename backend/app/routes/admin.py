@@ -1,16 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.user import User, UserRole, UserStatus
 from app.models.department import Department, DepartmentStatus
 from app.models.face_encoding import FaceEncoding, FaceEncodingStatus
-from app.models.attendance import AttendanceRecord
+from app.models.report import Report, ReportStatus
 from app.utils.decorators import admin_required
+from app.services.attendance_service import AttendanceService
 from app.services.report_service import ReportService
+from app.services.report_worker import report_worker
+from app.services.statistics_service import StatisticsService
+import os
 import uuid
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+attendance_service = AttendanceService()
 report_service = ReportService()
+statistics_service = StatisticsService()
 
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
@@ -195,75 +201,20 @@ def bulk_attendance_operations():
         from datetime import datetime
         target_date = datetime.fromisoformat(date_str).date()
 
-        results = []
-
-        if operation == 'mark':
-            for user_id in user_ids:
-                # Check if already marked
-                existing = AttendanceRecord.query.filter(
-                    db.and_(AttendanceRecord.user_id == user_id, AttendanceRecord.date_only == target_date)
-                ).first()
-
-                if existing:
-                    results.append({
-                        'user_id': user_id,
-                        'status': 'already_marked'
-                    })
-                    continue
-
-                # Mark attendance
-                record = AttendanceRecord(
-                    user_id=user_id,
-                    date_only=target_date,
-                    status=status or 'Present',
-                    source='manual'
-                )
-                db.session.add(record)
-                results.append({
-                    'user_id': user_id,
-                    'status': 'marked'
-                })
-
-        elif operation == 'update':
-            for user_id in user_ids:
-                record = AttendanceRecord.query.filter(
-                    db.and_(AttendanceRecord.user_id == user_id, AttendanceRecord.date_only == target_date)
-                ).first()
-
-                if record:
-                    record.status = status
-                    results.append({
-                        'user_id': user_id,
-                        'status': 'updated'
-                    })
-                else:
-                    results.append({
-                        'user_id': user_id,
-                        'status': 'not_found'
-                    })
-
-        elif operation == 'delete':
-            for user_id in user_ids:
-                record = AttendanceRecord.query.filter(
-                    db.and_(AttendanceRecord.user_id == user_id, AttendanceRecord.date_only == target_date)
-                ).first()
-
-                if record:
-                    db.session.delete(record)
-                    results.append({
-                        'user_id': user_id,
-                        'status': 'deleted'
-                    })
-                else:
-                    results.append({
-                        'user_id': user_id,
-                        'status': 'not_found'
-                    })
+        # Set-based: one lookup plus one write statement per chunk of users
+        outcomes = attendance_service.apply_bulk(
+            operation,
+            user_ids,
+            target_date,
+            status=status or ('Present' if operation == 'mark' else None)
+        )
 
-        db.session.commit()
+        results = [{'user_id': outcome['user_id'], 'status': outcome['status']} for outcome in outcomes]
 
         return jsonify({'results': results}), 200
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -271,7 +222,7 @@ def bulk_attendance_operations():
 @admin_bp.route('/reports/generate', methods=['POST'])
 @admin_required
 def generate_report():
-    """Generate custom report"""
+    """Queue a custom report; poll GET /reports/<report_id> for its progress"""
     try:
         data = request.get_json()
         report_type = data.get('type')  # 'attendance', 'users', 'departments'
@@ -282,50 +233,89 @@ def generate_report():
         if not start_date or not end_date:
             return jsonify({'error': 'Start date and end date required'}), 400
 
-        report_data = report_service.generate_report(
+        report, reused = report_service.create_report_job(
+            user_id=get_jwt_identity(),
             report_type=report_type,
             start_date=start_date,
             end_date=end_date,
             filters=filters
         )
+        if not reused:
+            report_worker.notify(current_app._get_current_object())
+
+        result = {
+            'message': 'Identical report already available' if reused else 'Report queued',
+            'report_id': report.id,
+            'status': report.status.value,
+            'status_url': f"/api/admin/reports/{report.id}",
+            'cached': reused
+        }
+        if report.status == ReportStatus.COMPLETED:
+            result['download_url'] = f"/downloads/reports/{os.path.basename(report.file_path)}"
+        return jsonify(result), 200 if reused else 202
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
-        return jsonify({
-            'message': 'Report generated successfully',
-            'report_id': report_data['report_id'],
-            'download_url': report_data['download_url']
-        }), 200
+@admin_bp.route('/reports/<report_id>', methods=['GET'])
+@admin_required
+def get_report_status(report_id):
+    """Report job status, progress and, once completed, its download URL"""
+    try:
+        report = db.session.get(Report, report_id)
+        if not report:
+            return jsonify({'error': 'Report not found'}), 404
+
+        if report.status == ReportStatus.PENDING:
+            # Revives jobs queued before a restart
+            report_worker.notify(current_app._get_current_object())
+
+        result = report.to_dict()
+        if report.status == ReportStatus.COMPLETED and report.file_path:
+            result['download_url'] = f"/downloads/reports/{os.path.basename(report.file_path)}"
+
+        return jsonify({'report': result}), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/reports/attendance.csv', methods=['GET'])
+@admin_required
+def download_attendance_csv():
+    """Stream the attendance report as a CSV download (chunked, no file written)"""
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        if not start_date or not end_date:
+            return jsonify({'error': 'Start date and end date required'}), 400
+
+        from datetime import datetime
+        start = datetime.fromisoformat(start_date).date()
+        end = datetime.fromisoformat(end_date).date()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows = report_service.stream_attendance_csv(
+        start, end,
+        department=request.args.get('department'),
+        user_id=request.args.get('user_id')
+    )
+    filename = f"attendance_report_{start.isoformat()}_{end.isoformat()}.csv"
+    return Response(
+        stream_with_context(rows),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @admin_bp.route('/system/stats', methods=['GET'])
 @admin_required
 def get_system_stats():
     """Get system-wide statistics"""
     try:
-        total_users = User.query.count()
-        active_users = User.query.filter_by(status='Active').count()
-        total_departments = Department.query.count()
-        total_face_encodings = FaceEncoding.query.count()
-        verified_face_encodings = FaceEncoding.query.filter_by(status='verified').count()
-        total_attendance_records = AttendanceRecord.query.count()
-
-        # Today's attendance
-        from datetime import date
-        today = date.today()
-        today_attendance = AttendanceRecord.query.filter_by(date_only=today).count()
-
-        return jsonify({
-            'system_stats': {
-                'total_users': total_users,
-                'active_users': active_users,
-                'total_departments': total_departments,
-                'total_face_encodings': total_face_encodings,
-                'verified_face_encodings': verified_face_encodings,
-                'total_attendance_records': total_attendance_records,
-                'today_attendance': today_attendance
-            }
-        }), 200
+        return jsonify({'system_stats': statistics_service.get_system_stats()}), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
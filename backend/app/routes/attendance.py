@@ -4,6 +4,7 @@ from datetime import datetime, date, timedelta
 from app import db
 from app.models.attendance import AttendanceRecord, AttendanceStatus, AttendanceSource
 from app.models.user import User, UserRole
+from app.services.attendance_rollup import record_attendance_changes
 from app.services.attendance_service import AttendanceService
 from app.utils.decorators import admin_required
 from sqlalchemy import and_, func
@@ -19,18 +20,6 @@ def mark_attendance():
         user_id = get_jwt_identity()
         data = request.get_json() or {}
 
-        # Check if already marked today
-        today = date.today()
-        existing = AttendanceRecord.query.filter(
-            and_(AttendanceRecord.user_id == user_id, AttendanceRecord.date_only == today)
-        ).first()
-
-        if existing:
-            return jsonify({
-                'message': 'Attendance already marked for today',
-                'record': existing.to_dict()
-            }), 409
-
         # Determine status based on time
         current_time = datetime.now().time()
         # Assume 9 AM is the cutoff for late
@@ -40,7 +29,7 @@ def mark_attendance():
         if current_time > late_cutoff:
             status = AttendanceStatus.LATE
 
-        # Mark attendance
+        # Mark attendance (answers 409 if already marked today)
         result, status_code = attendance_service.mark_attendance(
             user_id=user_id,
             status=status,
@@ -191,7 +180,9 @@ def update_attendance_record(record_id):
 
         data = request.get_json()
         if 'status' in data:
-            record.status = data['status']
+            old_status = record.status
+            record.status = AttendanceStatus(data['status'])
+            record_attendance_changes([(record.user_id, record.date_only, old_status, record.status)])
         if 'location' in data:
             record.location = data['location']
 
@@ -219,34 +210,16 @@ def bulk_mark_attendance():
 
         attendance_date = datetime.fromisoformat(attendance_date).date()
 
-        results = []
-        for user_id in user_ids:
-            # Check if already marked
-            existing = AttendanceRecord.query.filter(
-                and_(AttendanceRecord.user_id == user_id, AttendanceRecord.date_only == attendance_date)
-            ).first()
-
-            if existing:
-                results.append({
-                    'user_id': user_id,
-                    'status': 'already_marked',
-                    'record': existing.to_dict()
-                })
-                continue
-
-            # Mark attendance
-            result, _ = attendance_service.mark_attendance(
-                user_id=user_id,
-                status=status,
-                location=location,
-                source=AttendanceSource.MANUAL
-            )
-
-            results.append({
-                'user_id': user_id,
-                'status': 'marked' if result.get('success') else 'failed',
-                'record_id': result.get('record_id')
-            })
+        # One lookup and one bulk INSERT per chunk of users
+        results = attendance_service.apply_bulk(
+            'mark',
+            user_ids,
+            attendance_date,
+            status=status,
+            location=location,
+            source=AttendanceSource.MANUAL,
+            include_records=True
+        )
 
         return jsonify({'results': results}), 200
 
@@ -1,26 +1,37 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 import os
 import base64
 import numpy as np
-try:
-    import face_recognition
-    FACE_RECOGNITION_AVAILABLE = True
-except ImportError:
-    FACE_RECOGNITION_AVAILABLE = False
-from PIL import Image
 import io
+from PIL import Image
 from app import db
 from app.models.face_encoding import FaceEncoding, FaceEncodingStatus
 from app.models.user import User
 from app.services.face_service import FaceService
+from app.services.face_encoding_format import encode_encoding
+from app.services.face_pipeline import image_hash, save_image_bytes
+from app.services.face_worker import face_worker, FaceWorkerBusy, FaceWorkerTimeout
 from app.utils.decorators import admin_required
 from config import Config
 
 face_bp = Blueprint('face', __name__, url_prefix='/api/face')
 face_service = FaceService()
 
+# Endpoints that run the face models; the rest only read or update stored encodings
+FACE_MODEL_ENDPOINTS = {'face.enroll_face', 'face.recognize_face', 'face.recognize_faces_batch'}
+
+@face_bp.before_request
+def _require_face_recognition():
+    """503 for face model endpoints when face_recognition is not installed"""
+    if request.endpoint in FACE_MODEL_ENDPOINTS and not current_app.config['FACE_RECOGNITION_AVAILABLE']:
+        return jsonify({'error': 'Face recognition is not available on this server'}), 503
+
+def _face_worker_unavailable(error):
+    """503 with Retry-After when the face worker pool is saturated or timed out"""
+    return jsonify({'error': str(error)}), 503, {'Retry-After': str(error.retry_after)}
+
 @face_bp.route('/enroll', methods=['POST'])
 @jwt_required()
 def enroll_face():
@@ -45,45 +56,54 @@ def enroll_face():
         if 'image' not in request.files:
             return jsonify({'error': 'No image provided'}), 400
 
-        image_file = request.files['image']
+        image_bytes = request.files['image'].read()
 
-        # Process image
-        image = Image.open(image_file)
-        image_array = np.array(image)
+        # Reject the user's own exact re-uploads with one indexed lookup, before
+        # any face processing (other users' images are none of their business)
+        upload_hash = image_hash(image_bytes)
+        duplicate = db.session.query(FaceEncoding.id).filter(
+            FaceEncoding.image_hash == upload_hash,
+            FaceEncoding.user_id == user_id
+        ).first()
+        if duplicate:
+            return jsonify({
+                'error': 'This image has already been enrolled',
+                'face_encoding_id': duplicate.id
+            }), 409
 
-        # Detect faces
-        face_locations = face_recognition.face_locations(image_array)
-        if len(face_locations) == 0:
+        # Decode, detect, encode and score the image once in the face worker pool
+        analysis = face_service.analyze_face(image_bytes)
+
+        if analysis['face_count'] == 0:
             return jsonify({'error': 'No face detected in image'}), 400
-        elif len(face_locations) > 1:
+        elif analysis['face_count'] > 1:
             return jsonify({'error': 'Multiple faces detected. Please provide image with single face'}), 400
 
-        # Get face encoding
-        face_encodings = face_recognition.face_encodings(image_array, face_locations)
-        if len(face_encodings) == 0:
+        encoding = analysis['encoding']
+        if encoding is None:
             return jsonify({'error': 'Could not encode face'}), 400
 
-        encoding = face_encodings[0]
-
-        # Save image file
+        # Keep the upload as sent (the analysis ran on a downscaled copy), so
+        # it can be re-encoded at full resolution later
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        image_filename = f"{user_id}_{timestamp}.jpg"
+        image_format = Image.open(io.BytesIO(image_bytes)).format
+        extension = 'jpg' if image_format in (None, 'JPEG') else image_format.lower()
+        image_filename = f"{user_id}_{timestamp}.{extension}"
         image_path = os.path.join(Config.UPLOAD_FOLDER, 'faces', image_filename)
 
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(image_path), exist_ok=True)
-        image.save(image_path)
+        save_image_bytes(image_bytes, image_path)
 
         # Create face encoding record
         face_encoding_id = f"FACE_ENC_{user_id}_{timestamp}"
         face_encoding = FaceEncoding(
             id=face_encoding_id,
             user_id=user_id,
-            encoding_vector=encoding.tobytes(),
+            encoding_vector=encode_encoding(encoding),
             image_url=image_path,
+            image_hash=upload_hash,
             captured_at=datetime.utcnow(),
-            quality_score=1.0,  # TODO: Implement quality scoring
-            face_confidence=1.0,  # TODO: Implement confidence scoring
+            quality_score=analysis['quality_score'],
+            face_confidence=analysis['face_confidence'],
             status=FaceEncodingStatus.PENDING
         )
 
@@ -93,9 +113,15 @@ def enroll_face():
         return jsonify({
             'message': 'Face enrolled successfully. Awaiting verification.',
             'face_encoding_id': face_encoding_id,
-            'status': 'pending'
+            'status': 'pending',
+            'quality_score': analysis['quality_score'],
+            'quality_issues': analysis['issues'],
+            'face_confidence': analysis['face_confidence'],
+            'timings_ms': analysis['timings']
         }), 201
 
+    except (FaceWorkerBusy, FaceWorkerTimeout) as e:
+        return _face_worker_unavailable(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -110,20 +136,32 @@ def recognize_face():
 
         image_file = request.files['image']
         location = request.form.get('location', 'Main Gate')
+        # 'single' matches the first face; 'group' matches every face (classroom mode)
+        mode = request.form.get('mode', request.args.get('mode', 'single'))
 
-        # Process image
-        image = Image.open(image_file)
-        image_array = np.array(image)
+        # Detect and encode faces in the face worker pool
+        processed = face_worker.process_image(
+            image_file.read(), max_faces=None if mode == 'group' else 1, use_cache=True
+        )
 
-        # Detect and encode face
-        face_locations = face_recognition.face_locations(image_array)
+        face_locations = processed['locations']
         if len(face_locations) == 0:
             return jsonify({'error': 'No face detected'}), 400
 
-        face_encodings = face_recognition.face_encodings(image_array, face_locations)
+        face_encodings = processed['encodings']
         if len(face_encodings) == 0:
             return jsonify({'error': 'Could not encode face'}), 400
 
+        if mode == 'group':
+            faces = [
+                {'face_index': face_index, 'location': list(face_locations[face_index])}
+                for face_index in range(len(face_encodings))
+            ]
+            group_result = _recognize_and_mark(faces, face_encodings, location)
+            group_result['mode'] = 'group'
+            group_result['timings_ms'] = processed['timings']
+            return jsonify(group_result), 200
+
         unknown_encoding = face_encodings[0]
 
         # Find best match
@@ -154,7 +192,8 @@ def recognize_face():
                 'user_id': result['user_id'],
                 'user_name': result['user_name'],
                 'message': 'Attendance already marked for today',
-                'confidence': result['confidence']
+                'confidence': result['confidence'],
+                'timings_ms': processed['timings']
             }), 200
 
         return jsonify({
@@ -163,12 +202,110 @@ def recognize_face():
             'user_name': result['user_name'],
             'message': 'Attendance marked successfully',
             'confidence': result['confidence'],
-            'attendance_record': attendance_result
+            'attendance_record': attendance_result,
+            'timings_ms': processed['timings']
         }), 200
 
+    except (FaceWorkerBusy, FaceWorkerTimeout) as e:
+        return _face_worker_unavailable(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@face_bp.route('/recognize/batch', methods=['POST'])
+def recognize_faces_batch():
+    """Recognize every face in a burst of frames (or one crowded image) and mark attendance"""
+    try:
+        image_files = request.files.getlist('images') or request.files.getlist('image')
+        if not image_files:
+            return jsonify({'error': 'No image provided'}), 400
+
+        max_images = current_app.config['FACE_BATCH_MAX_IMAGES']
+        if len(image_files) > max_images:
+            return jsonify({'error': f'At most {max_images} images per request'}), 400
+
+        location = request.form.get('location', 'Main Gate')
+
+        # Detect and encode every face in every image
+        faces = []
+        unknown_encodings = []
+        timings = []
+        processed_images = face_worker.process_images(
+            [image_file.read() for image_file in image_files], use_cache=True
+        )
+        for image_index, processed in enumerate(processed_images):
+            timings.append(processed['timings'])
+
+            for face_index, encoding in enumerate(processed['encodings']):
+                faces.append({'image_index': image_index, 'face_index': face_index})
+                unknown_encodings.append(encoding)
+
+        if not unknown_encodings:
+            return jsonify({'error': 'No face detected'}), 400
+
+        batch_result = _recognize_and_mark(faces, unknown_encodings, location)
+        batch_result['timings_ms'] = timings
+        return jsonify(batch_result), 200
+
+    except (FaceWorkerBusy, FaceWorkerTimeout) as e:
+        return _face_worker_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _recognize_and_mark(faces, unknown_encodings, location):
+    """
+    Match many faces in one vectorized pass and mark attendance for every
+    recognized user in one transaction.
+
+    Faces matched to a user who was already matched by a closer face are
+    flagged as duplicates; each user is marked once.
+    """
+    # Match all faces against the gallery in one pass
+    results = face_service.recognize_faces_batch(
+        np.array(unknown_encodings), threshold=Config.FACE_RECOGNITION_THRESHOLD
+    )
+
+    # Closest face per recognized user
+    best_faces = {}
+    for face_number, result in enumerate(results):
+        if result['recognized']:
+            current = best_faces.get(result['user_id'])
+            if current is None or result['distance'] < results[current]['distance']:
+                best_faces[result['user_id']] = face_number
+
+    # Mark attendance for every recognized user in one transaction
+    from app.services.attendance_service import AttendanceService
+    from app.models.attendance import AttendanceSource
+    attendance_service = AttendanceService()
+
+    attendance_results, status_code = attendance_service.mark_attendance_batch(
+        [results[face_number] for face_number in best_faces.values()],
+        location=location,
+        source=AttendanceSource.FACE_RECOGNITION
+    )
+    if status_code != 200:
+        raise RuntimeError(attendance_results.get('error', 'Could not mark attendance'))
+
+    for face_number, (face, result) in enumerate(zip(faces, results)):
+        face['recognized'] = result['recognized']
+        if result['recognized']:
+            face.update({
+                'user_id': result['user_id'],
+                'user_name': result['user_name'],
+                'confidence': result['confidence'],
+                'distance': result['distance'],
+                'duplicate': best_faces[result['user_id']] != face_number,
+                'attendance': attendance_results[result['user_id']]['status']
+            })
+
+    return {
+        'faces': faces,
+        'recognized_count': len(best_faces),
+        'attendance': [
+            {'user_id': user_id, **attendance}
+            for user_id, attendance in attendance_results.items()
+        ]
+    }
+
 @face_bp.route('/user/<user_id>/encodings', methods=['GET'])
 @jwt_required()
 def get_user_face_encodings(user_id):
@@ -203,7 +340,10 @@ def verify_face_encoding(encoding_id):
         status = data.get('status', 'verified')
         notes = data.get('notes')
 
-        encoding.status = status
+        try:
+            encoding.status = FaceEncodingStatus(status)
+        except ValueError:
+            return jsonify({'error': 'Invalid status'}), 400
         if notes:
             encoding.verification_notes = notes
 
@@ -1,7 +1,8 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from app import db
 from datetime import datetime
 from app.utils.logger import setup_logger
+from app.utils.response_cache import response_cache
 from sqlalchemy import text as sa_text
 
 health_bp = Blueprint('health', __name__, url_prefix='/api/health')
@@ -32,7 +33,9 @@ def detailed_health_check():
         'services': {
             'database': db_status,
             'api': 'healthy'
-        }
+        },
+        'startup_ms': current_app.extensions.get('startup_timings', {}),
+        'response_cache': response_cache.stats()
     }), 200 if db_status == 'healthy' else 503
 
 @health_bp.route('/welcome', methods=['GET'])
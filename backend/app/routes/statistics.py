@@ -4,14 +4,19 @@ from datetime import datetime, date, timedelta
 from app import db
 from app.models.user import User, UserRole
 from app.models.attendance import AttendanceRecord, AttendanceStatus
+from app.models.attendance_rollup import AttendanceDailyRollup, AttendanceMonthlyCounter
 from app.models.department import Department
 from app.utils.decorators import admin_required
+from app.services.statistics_service import StatisticsService
+from app.utils.response_cache import response_cache
 from sqlalchemy import func, and_, case
 
 statistics_bp = Blueprint('statistics', __name__, url_prefix='/api/statistics')
+statistics_service = StatisticsService()
 
 @statistics_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
+@response_cache.cached()
 def get_dashboard_stats():
     """Get dashboard statistics"""
     try:
@@ -22,44 +27,21 @@ def get_dashboard_stats():
 
         if current_user.role == UserRole.ADMIN:
             # Admin dashboard
-            total_users = User.query.filter_by(status='Active').count()
-            total_departments = Department.query.filter_by(status='Active').count()
-
-            # Today's attendance
-            today_present = AttendanceRecord.query.filter(
-                and_(AttendanceRecord.date_only == today, AttendanceRecord.status == 'Present')
-            ).count()
-
-            today_absent = total_users - today_present
-
-            # This week's attendance trend
             week_start = today - timedelta(days=today.weekday())
             week_end = week_start + timedelta(days=6)
+            response_cache.cache_dates(week_start, week_end)
 
-            weekly_stats = db.session.query(
-                AttendanceRecord.date_only,
-                func.count(case((AttendanceRecord.status == 'Present', 1))).label('present')
-            ).filter(
-                AttendanceRecord.date_only.between(week_start, week_end)
-            ).group_by(AttendanceRecord.date_only).all()
-
-            weekly_trend = {str(stat.date_only): stat.present for stat in weekly_stats}
-
-            return jsonify({
-                'total_users': total_users,
-                'total_departments': total_departments,
-                'today_present': today_present,
-                'today_absent': today_absent,
-                'weekly_trend': weekly_trend
-            }), 200
+            return jsonify(statistics_service.get_admin_dashboard(today, week_start, week_end)), 200
 
         else:
             # Employee dashboard
-            # Personal attendance stats
-            total_days = AttendanceRecord.query.filter_by(user_id=user_id).count()
-            present_days = AttendanceRecord.query.filter(
-                and_(AttendanceRecord.user_id == user_id, AttendanceRecord.status == 'Present')
-            ).count()
+            # Personal attendance stats, summed from the monthly counters
+            counters = db.session.query(
+                func.coalesce(func.sum(AttendanceMonthlyCounter.total_days), 0).label('total_days'),
+                func.coalesce(func.sum(AttendanceMonthlyCounter.present_days), 0).label('present_days')
+            ).filter(AttendanceMonthlyCounter.user_id == user_id).one()
+            total_days = int(counters.total_days)
+            present_days = int(counters.present_days)
 
             attendance_rate = (present_days / total_days * 100) if total_days > 0 else 0
 
@@ -81,6 +63,7 @@ def get_dashboard_stats():
 
 @statistics_bp.route('/attendance/rate', methods=['GET'])
 @jwt_required()
+@response_cache.cached()
 def get_attendance_rate():
     """Get attendance rate statistics"""
     try:
@@ -104,17 +87,19 @@ def get_attendance_rate():
             start_date = date(today.year, 1, 1)
         else:
             start_date = today.replace(day=1)
+        response_cache.cache_dates(start_date, today)
 
-        # Get attendance rates by user
+        # Get attendance rates by user (at most 12 monthly counter rows each)
+        counters = AttendanceMonthlyCounter
         query = db.session.query(
             User.id,
             User.name,
             User.department,
-            func.count(AttendanceRecord.id).label('total_days'),
-            func.sum(case((AttendanceRecord.status == 'Present', 1), else_=0)).label('present_days')
-        ).outerjoin(AttendanceRecord, and_(
-            AttendanceRecord.user_id == User.id,
-            AttendanceRecord.date_only.between(start_date, today)
+            func.coalesce(func.sum(counters.total_days), 0).label('total_days'),
+            func.coalesce(func.sum(counters.present_days), 0).label('present_days')
+        ).outerjoin(counters, and_(
+            counters.user_id == User.id,
+            counters.month_start.between(start_date, today)
         )).filter(User.status == 'Active')
 
         if department:
@@ -124,13 +109,14 @@ def get_attendance_rate():
 
         stats = []
         for result in results:
-            attendance_rate = (result.present_days / result.total_days * 100) if result.total_days > 0 else 0
+            total_days, present_days = int(result.total_days), int(result.present_days)
+            attendance_rate = (present_days / total_days * 100) if total_days > 0 else 0
             stats.append({
                 'user_id': result.id,
                 'name': result.name,
                 'department': result.department,
-                'total_days': result.total_days,
-                'present_days': result.present_days,
+                'total_days': total_days,
+                'present_days': present_days,
                 'attendance_rate': round(attendance_rate, 2)
             })
 
@@ -146,6 +132,7 @@ def get_attendance_rate():
 
 @statistics_bp.route('/attendance/trends', methods=['GET'])
 @jwt_required()
+@response_cache.cached()
 def get_attendance_trends():
     """Get attendance trends over time"""
     try:
@@ -159,26 +146,30 @@ def get_attendance_trends():
         department = request.args.get('department')
 
         start_date = date.today() - timedelta(days=days)
+        response_cache.cache_dates(start_date, date.today())
 
+        rollup = AttendanceDailyRollup
         query = db.session.query(
-            AttendanceRecord.date_only,
-            func.count(case((AttendanceRecord.status == 'Present', 1))).label('present'),
-            func.count(case((AttendanceRecord.status == 'Absent', 1))).label('absent'),
-            func.count(case((AttendanceRecord.status == 'Late', 1))).label('late')
-        ).filter(AttendanceRecord.date_only.between(start_date, date.today()))
+            rollup.date_only,
+            func.sum(case((rollup.status == AttendanceStatus.PRESENT, rollup.count), else_=0)).label('present'),
+            func.sum(case((rollup.status == AttendanceStatus.ABSENT, rollup.count), else_=0)).label('absent'),
+            func.sum(case((rollup.status == AttendanceStatus.LATE, rollup.count), else_=0)).label('late')
+        ).filter(rollup.date_only.between(start_date, date.today()))
 
         if department:
-            query = query.join(User).filter(User.department == department)
+            query = query.filter(rollup.department == department)
 
-        results = query.group_by(AttendanceRecord.date_only).order_by(AttendanceRecord.date_only).all()
+        results = query.group_by(rollup.date_only).having(
+            func.sum(rollup.count) > 0
+        ).order_by(rollup.date_only).all()
 
         trends = []
         for result in results:
             trends.append({
                 'date': result.date_only.isoformat(),
-                'present': result.present,
-                'absent': result.absent,
-                'late': result.late
+                'present': int(result.present),
+                'absent': int(result.absent),
+                'late': int(result.late)
             })
 
         return jsonify({
@@ -191,6 +182,7 @@ def get_attendance_trends():
 
 @statistics_bp.route('/departments', methods=['GET'])
 @jwt_required()
+@response_cache.cached()
 def get_department_stats():
     """Get statistics by department"""
     try:
@@ -201,19 +193,25 @@ def get_department_stats():
             return jsonify({'error': 'Access denied'}), 403
 
         today = date.today()
+        response_cache.cache_dates(today)
+
+        # Get department-wise statistics; today's counts come from the rollup
+        rollup = AttendanceDailyRollup
+        today_counts = db.session.query(
+            rollup.department,
+            func.sum(case((rollup.status == AttendanceStatus.PRESENT, rollup.count), else_=0)).label('present'),
+            func.sum(case((rollup.status == AttendanceStatus.ABSENT, rollup.count), else_=0)).label('absent')
+        ).filter(rollup.date_only == today).group_by(rollup.department).subquery()
 
-        # Get department-wise statistics
         stats = db.session.query(
             Department.id,
             Department.name,
             func.count(User.id).label('total_employees'),
-            func.sum(case((AttendanceRecord.status == 'Present', 1), else_=0)).label('present_today'),
-            func.sum(case((AttendanceRecord.status == 'Absent', 1), else_=0)).label('absent_today')
+            func.max(today_counts.c.present).label('present_today'),
+            func.max(today_counts.c.absent).label('absent_today')
         ).outerjoin(User, and_(User.department == Department.id, User.status == 'Active')
-        ).outerjoin(AttendanceRecord, and_(
-            AttendanceRecord.user_id == User.id,
-            AttendanceRecord.date_only == today
-        )).filter(Department.status == 'Active'
+        ).outerjoin(today_counts, today_counts.c.department == Department.id
+        ).filter(Department.status == 'Active'
         ).group_by(Department.id, Department.name).all()
 
         department_stats = []
@@ -235,6 +233,7 @@ def get_department_stats():
 
 @statistics_bp.route('/user/<user_id>/summary', methods=['GET'])
 @jwt_required()
+@response_cache.cached()
 def get_user_attendance_summary(user_id):
     """Get attendance summary for a specific user"""
     try:
@@ -258,28 +257,32 @@ def get_user_attendance_summary(user_id):
             start_date = date(today.year, 1, 1)
         else:
             start_date = today.replace(day=1)
+        response_cache.cache_dates(start_date, today)
 
-        # Get user's attendance statistics
+        # Get user's attendance statistics: the period starts on a month
+        # boundary, so it is the sum of at most 12 monthly counter rows
+        counters = AttendanceMonthlyCounter
         stats = db.session.query(
-            func.count(AttendanceRecord.id).label('total_days'),
-            func.sum(case((AttendanceRecord.status == 'Present', 1), else_=0)).label('present_days'),
-            func.sum(case((AttendanceRecord.status == 'Absent', 1), else_=0)).label('absent_days'),
-            func.sum(case((AttendanceRecord.status == 'Late', 1), else_=0)).label('late_days')
+            func.sum(counters.total_days).label('total_days'),
+            func.sum(counters.present_days).label('present_days'),
+            func.sum(counters.absent_days).label('absent_days'),
+            func.sum(counters.late_days).label('late_days')
         ).filter(
-            and_(AttendanceRecord.user_id == user_id, AttendanceRecord.date_only.between(start_date, today))
+            and_(counters.user_id == user_id, counters.month_start.between(start_date, today))
         ).first()
+        total_days = int(stats.total_days or 0)
 
-        attendance_rate = (stats.present_days / stats.total_days * 100) if stats.total_days > 0 else 0
+        attendance_rate = (stats.present_days / total_days * 100) if total_days > 0 else 0
 
         return jsonify({
             'user_id': user_id,
             'period': period,
             'start_date': start_date.isoformat(),
             'end_date': today.isoformat(),
-            'total_days': stats.total_days,
-            'present_days': stats.present_days,
-            'absent_days': stats.absent_days,
-            'late_days': stats.late_days,
+            'total_days': total_days,
+            'present_days': int(stats.present_days) if total_days else None,
+            'absent_days': int(stats.absent_days) if total_days else None,
+            'late_days': int(stats.late_days) if total_days else None,
             'attendance_rate': round(attendance_rate, 2)
         }), 200
 
@@ -0,0 +1,249 @@
+"""
+Maintenance of the attendance_daily_rollup and attendance_monthly_counters
+tables.
+
+Every attendance write reports what it changed as
+(user_id, date, old_status, new_status) tuples, with old_status None for
+an insert and new_status None for a delete. Changes are grouped by
+(date, status, +1/-1) and each group is applied with one upsert:
+
+    INSERT INTO attendance_daily_rollup
+    SELECT :date, COALESCE(users.department, ''), :status, COUNT(*) * :sign
+    FROM users WHERE users.id IN (...) GROUP BY 2
+    ON DUPLICATE KEY UPDATE count = count + VALUES(count)
+
+The per-user monthly counters get one more executemany upsert adding the
+per-status deltas to each (user_id, month_start) row. A check-in thus costs
+two extra statements and a bulk operation two per chunk. None of these
+functions commit; they run inside the caller's transaction.
+
+record_inserts_from_select is the set-based variant for records inserted
+with INSERT ... SELECT: the same two upserts read the users from a SELECT
+instead of a Python list.
+
+rebuild_rollup and rebuild_monthly_counters recompute a date range from
+attendance_records (backfill, or after writes that bypass AttendanceService).
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from app import db
+from app.models.attendance import AttendanceRecord, AttendanceStatus
+from app.models.attendance_rollup import AttendanceDailyRollup, AttendanceMonthlyCounter
+from app.models.user import User
+from app.utils.response_cache import invalidate_dates_on_commit
+from config import Config
+from typing import Iterable, Optional, Tuple
+
+ROLLUP_KEY = ('date_only', 'department', 'status')
+ROLLUP_COLUMNS = ROLLUP_KEY + ('count', 'updated_at')
+COUNTER_KEY = ('user_id', 'month_start')
+COUNTER_COUNTS = ('total_days',) + tuple(AttendanceMonthlyCounter.STATUS_COLUMNS.values())
+
+
+def _as_status(status) -> AttendanceStatus:
+    return AttendanceStatus(status) if isinstance(status, str) else status
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(month_start: date) -> date:
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+
+def _increment_upsert(table, key_columns, count_columns, rows_select=None):
+    """
+    INSERT into table, adding the count columns to the existing row on key
+    conflicts. Rows come from rows_select, or are passed to execute().
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f'Attendance rollup upsert is not implemented for {dialect}')
+
+    statement = insert(table)
+    if rows_select is not None:
+        statement = statement.from_select(key_columns + count_columns + ('updated_at',), rows_select)
+
+    new_values = statement.inserted if dialect == 'mysql' else statement.excluded
+    values = {column: table.c[column] + new_values[column] for column in count_columns}
+    values['updated_at'] = new_values.updated_at
+    if dialect == 'mysql':
+        return statement.on_duplicate_key_update(values)
+    return statement.on_conflict_do_update(index_elements=list(key_columns), set_=values)
+
+
+def record_attendance_changes(changes: Iterable[Tuple[str, date, Optional[object], Optional[object]]]):
+    """
+    Apply attendance record changes to the rollup
+
+    Args:
+        changes: (user_id, date, old_status, new_status) tuples
+    """
+    groups = defaultdict(set)
+    counters = defaultdict(lambda: dict.fromkeys(COUNTER_COUNTS, 0))
+    status_columns = AttendanceMonthlyCounter.STATUS_COLUMNS
+    for user_id, attendance_date, old_status, new_status in changes:
+        old_status, new_status = _as_status(old_status), _as_status(new_status)
+        if old_status == new_status:
+            continue
+        deltas = counters[(user_id, _month_start(attendance_date))]
+        if old_status is not None:
+            groups[(attendance_date, old_status, -1)].add(user_id)
+            deltas[status_columns[old_status]] -= 1
+            deltas['total_days'] -= 1
+        if new_status is not None:
+            groups[(attendance_date, new_status, 1)].add(user_id)
+            deltas[status_columns[new_status]] += 1
+            deltas['total_days'] += 1
+
+    if not groups:
+        return
+    invalidate_dates_on_commit({attendance_date for attendance_date, _, _ in groups})
+
+    table = AttendanceDailyRollup.__table__
+    department = db.func.coalesce(User.department, '')
+    now = datetime.utcnow()
+    chunk_size = Config.ATTENDANCE_BULK_CHUNK_SIZE
+
+    for (attendance_date, status, sign), user_ids in groups.items():
+        user_ids = sorted(user_ids)
+        for offset in range(0, len(user_ids), chunk_size):
+            db.session.execute(_increment_upsert(table, ROLLUP_KEY, ('count',), db.select(
+                db.literal(attendance_date, table.c.date_only.type),
+                department,
+                db.literal(status, table.c.status.type),
+                db.func.count() * sign,
+                db.literal(now, table.c.updated_at.type)
+            ).where(User.id.in_(user_ids[offset:offset + chunk_size])).group_by(User.department)))
+
+    # A status change within a month leaves total_days alone but still moves
+    # one status column, so only all-zero deltas are dropped
+    counter_rows = [
+        {'user_id': user_id, 'month_start': month_start, 'updated_at': now, **deltas}
+        for (user_id, month_start), deltas in counters.items()
+        if any(deltas.values())
+    ]
+    if counter_rows:
+        db.session.execute(
+            _increment_upsert(AttendanceMonthlyCounter.__table__, COUNTER_KEY, COUNTER_COUNTS),
+            counter_rows
+        )
+
+
+def record_inserts_from_select(attendance_date: date, status, user_ids) -> None:
+    """
+    Apply records about to be inserted for a set of users to the rollup
+    and monthly counters, with one upsert ... SELECT each
+
+    Call it in the same transaction as the INSERT, while user_ids still
+    selects the same users (e.g. before an anti-join INSERT ... SELECT).
+
+    Args:
+        attendance_date: Date of the new records
+        status: Status of the new records
+        user_ids: SELECT of the user IDs getting a record
+    """
+    status = _as_status(status)
+    invalidate_dates_on_commit([attendance_date])
+    now = datetime.utcnow()
+    users = User.id.in_(user_ids)
+
+    table = AttendanceDailyRollup.__table__
+    department = db.func.coalesce(User.department, '')
+    db.session.execute(_increment_upsert(table, ROLLUP_KEY, ('count',), db.select(
+        db.literal(attendance_date, table.c.date_only.type),
+        department,
+        db.literal(status, table.c.status.type),
+        db.func.count(),
+        db.literal(now, table.c.updated_at.type)
+    ).where(users).group_by(User.department)))
+
+    table = AttendanceMonthlyCounter.__table__
+    status_column = AttendanceMonthlyCounter.STATUS_COLUMNS[status]
+    db.session.execute(_increment_upsert(table, COUNTER_KEY, COUNTER_COUNTS, db.select(
+        User.id,
+        db.literal(_month_start(attendance_date), table.c.month_start.type),
+        *(db.literal(1 if column in ('total_days', status_column) else 0, table.c[column].type)
+          for column in COUNTER_COUNTS),
+        db.literal(now, table.c.updated_at.type)
+    ).where(users)))
+
+
+def rebuild_rollup(start_date: date, end_date: date) -> int:
+    """
+    Recompute the rollup for a date range from attendance_records
+
+    Returns:
+        Number of rollup rows written
+    """
+    table = AttendanceDailyRollup.__table__
+    db.session.execute(db.delete(table).where(table.c.date_only.between(start_date, end_date)))
+    if (end_date - start_date).days < 31:
+        invalidate_dates_on_commit(start_date + timedelta(days=offset)
+                                   for offset in range((end_date - start_date).days + 1))
+
+    department = db.func.coalesce(User.department, '')
+    counts = db.select(
+        AttendanceRecord.date_only,
+        department,
+        AttendanceRecord.status,
+        db.func.count(),
+        db.literal(datetime.utcnow(), table.c.updated_at.type)
+    ).join(User, AttendanceRecord.user_id == User.id).where(
+        AttendanceRecord.date_only.between(start_date, end_date)
+    ).group_by(AttendanceRecord.date_only, User.department, AttendanceRecord.status)
+
+    return db.session.execute(db.insert(table).from_select(ROLLUP_COLUMNS, counts)).rowcount
+
+
+def rebuild_monthly_counters(start_date: date, end_date: date) -> int:
+    """
+    Recompute the monthly counters of every user for the calendar months
+    overlapping a date range, one month per statement
+
+    Returns:
+        Number of counter rows written
+    """
+    table = AttendanceMonthlyCounter.__table__
+    now = db.literal(datetime.utcnow(), table.c.updated_at.type)
+    status_counts = [
+        db.func.sum(db.case((AttendanceRecord.status == status, 1), else_=0))
+        for status in AttendanceMonthlyCounter.STATUS_COLUMNS
+    ]
+
+    written = 0
+    month_start = _month_start(start_date)
+    while month_start <= end_date:
+        next_month = _next_month(month_start)
+        db.session.execute(db.delete(table).where(table.c.month_start == month_start))
+        counts = db.select(
+            AttendanceRecord.user_id,
+            db.literal(month_start, table.c.month_start.type),
+            db.func.count(),
+            *status_counts,
+            now
+        ).where(
+            AttendanceRecord.date_only >= month_start,
+            AttendanceRecord.date_only < next_month
+        ).group_by(AttendanceRecord.user_id)
+        written += db.session.execute(
+            db.insert(table).from_select(COUNTER_KEY + COUNTER_COUNTS + ('updated_at',), counts)
+        ).rowcount
+        month_start = next_month
+
+    return written
+
+
+def attendance_date_range() -> Tuple[Optional[date], Optional[date]]:
+    """First and last date present in attendance_records"""
+    return db.session.query(
+        db.func.min(AttendanceRecord.date_only),
+        db.func.max(AttendanceRecord.date_only)
+    ).one()
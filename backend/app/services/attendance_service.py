@@ -1,7 +1,10 @@
 from app import db
-from app.models.attendance import AttendanceRecord, AttendanceStatus, AttendanceSource
-from app.models.user import User
+from app.models.attendance import AttendanceRecord, AttendanceStatus, AttendanceSource, VerificationStatus
+from app.models.user import User, UserStatus
+from app.services.attendance_rollup import record_attendance_changes, record_inserts_from_select
 from datetime import datetime, date, time
+from sqlalchemy.exc import IntegrityError
+from config import Config
 from typing import Dict, List, Optional
 
 class AttendanceService:
@@ -27,40 +30,205 @@ class AttendanceService:
             today = date.today()
             current_time = datetime.now().time()
 
-            # Check if already marked today
-            existing_record = AttendanceRecord.query.filter(
-                db.and_(AttendanceRecord.user_id == user_id, AttendanceRecord.date_only == today)
-            ).first()
-
-            if existing_record:
-                return {
-                    'message': 'Attendance already marked for today',
-                    'record': existing_record.to_dict()
-                }, 409
-
-            # Create attendance record
             record = AttendanceRecord(
                 user_id=user_id,
                 date_only=today,
                 time_only=current_time,
-                status=status,
+                status=AttendanceStatus(status) if isinstance(status, str) else status,
                 face_encoding_id=face_encoding_id,
                 location=location or 'Office',
-                source=source
+                source=AttendanceSource(source) if isinstance(source, str) else source
             )
 
+            # No existence check up front: the INSERT itself detects a second
+            # mark through uq_attendance_user_date, so a normal check-in is a
+            # single statement plus COMMIT
             db.session.add(record)
-            db.session.commit()
+            try:
+                db.session.flush()
+            except IntegrityError:
+                db.session.rollback()
+                existing_record = AttendanceRecord.query.filter(
+                    db.and_(AttendanceRecord.user_id == user_id, AttendanceRecord.date_only == today)
+                ).first()
+                if existing_record is None:
+                    raise
+                return {
+                    'message': 'Attendance already marked for today',
+                    'record': existing_record.to_dict()
+                }, 409
 
-            return {
+            record_attendance_changes([(user_id, today, None, record.status)])
+
+            # Serialize before COMMIT expires the instance (avoids a reload SELECT)
+            result = {
                 'message': 'Attendance marked successfully',
                 'record': record.to_dict()
-            }, 201
+            }
+            db.session.commit()
+
+            return result, 201
+
+        except Exception as e:
+            db.session.rollback()
+            return {'error': str(e)}, 500
+
+    def mark_attendance_batch(self, matches: List[Dict], location: str = None,
+                              source=AttendanceSource.FACE_RECOGNITION) -> tuple:
+        """
+        Mark today's attendance for many recognized users in one transaction
+
+        Uses one existence query on (user_id, date_only) and one bulk INSERT
+        instead of one mark_attendance call per person. A check-in committed
+        between the two trips uq_attendance_user_date; the group is then
+        rolled back and retried once, so that user is reported as
+        already_marked instead of failing everyone.
+
+        Args:
+            matches: Recognition results with user_id, face_encoding_id,
+                     confidence and distance (see FaceService.recognize_face)
+            location: Location where attendance was marked
+            source: Source of attendance
+
+        Returns:
+            Tuple of ({user_id: {'status': 'marked'|'already_marked', 'record': ...}}, status_code)
+        """
+        try:
+            today = date.today()
+            current_time = datetime.now().time()
+
+            # A user seen in several frames/faces is marked once, with the closest match
+            best_matches = {}
+            for match in matches:
+                current = best_matches.get(match['user_id'])
+                if current is None or match['distance'] < current['distance']:
+                    best_matches[match['user_id']] = match
+
+            if not best_matches:
+                return {}, 200
+
+            for attempt in range(2):
+                existing_records = AttendanceRecord.query.filter(
+                    db.and_(AttendanceRecord.user_id.in_(best_matches.keys()), AttendanceRecord.date_only == today)
+                ).all()
+
+                results = {
+                    record.user_id: {'status': 'already_marked', 'record': record.to_dict()}
+                    for record in existing_records
+                }
+
+                new_rows = [
+                    {
+                        'user_id': user_id,
+                        'date_only': today,
+                        'time_only': current_time,
+                        'status': AttendanceStatus.PRESENT,
+                        'face_encoding_id': match.get('face_encoding_id'),
+                        'recognition_confidence': match.get('confidence'),
+                        'recognition_distance': match.get('distance'),
+                        'location': location or 'Office',
+                        'source': source
+                    }
+                    for user_id, match in best_matches.items()
+                    if user_id not in results
+                ]
+
+                if not new_rows:
+                    return results, 200
+
+                try:
+                    # One executemany INSERT for the whole group
+                    db.session.execute(db.insert(AttendanceRecord), new_rows)
+                except IntegrityError:
+                    db.session.rollback()
+                    if attempt:
+                        raise
+                    continue
+
+                record_attendance_changes(
+                    (row['user_id'], today, None, row['status']) for row in new_rows
+                )
+                # Only the generated IDs are read back; the rest of each record is in new_rows
+                record_ids = dict(db.session.query(AttendanceRecord.user_id, AttendanceRecord.id).filter(
+                    AttendanceRecord.user_id.in_([row['user_id'] for row in new_rows]),
+                    AttendanceRecord.date_only == today
+                ).all())
+                for row in new_rows:
+                    record = AttendanceRecord(id=record_ids.get(row['user_id']), **row)
+                    results[row['user_id']] = {'status': 'marked', 'record': record.to_dict()}
+                db.session.commit()
+
+                return results, 200
 
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 500
 
+    def materialize_absences(self, attendance_date: date = None) -> int:
+        """
+        Insert ABSENT records for every active user without a record on a date
+
+        Runs as one INSERT ... SELECT with an anti-join (users LEFT JOIN
+        attendance_records ... WHERE record IS NULL), so the cost does not
+        depend on the number of users in Python. The rollup and monthly
+        counters are incremented by upserts over the same anti-join, just
+        before the INSERT. Users who joined after the date or were deleted
+        are skipped. Safe to run more than once a day.
+
+        Args:
+            attendance_date: Date to close (default today)
+
+        Returns:
+            Number of ABSENT records inserted
+        """
+        attendance_date = attendance_date or date.today()
+        records = AttendanceRecord.__table__
+        now = datetime.utcnow()
+
+        columns = {
+            'user_id': User.id,
+            'date_only': attendance_date,
+            'status': AttendanceStatus.ABSENT,
+            'source': AttendanceSource.MANUAL,
+            'verification_status': VerificationStatus.VERIFIED,
+            'timestamp': now,
+            'created_at': now,
+            'updated_at': now,
+        }
+        absent_users = db.select(User.id).outerjoin(records, db.and_(
+            records.c.user_id == User.id,
+            records.c.date_only == attendance_date
+        )).where(
+            records.c.id.is_(None),
+            User.status == UserStatus.ACTIVE,
+            User.join_date <= attendance_date,
+            User.deleted_at.is_(None)
+        )
+        statement = db.insert(records).from_select(list(columns), absent_users.with_only_columns(*(
+            value if name == 'user_id' else db.literal(value, records.c[name].type).label(name)
+            for name, value in columns.items()
+        )))
+        absent_count = db.select(db.func.count()).select_from(absent_users.subquery())
+
+        # A check-in racing the job either trips uq_attendance_user_date or
+        # drops out of the anti-join between the counter upserts and the
+        # INSERT (the row counts differ); both roll back and retry once
+        for attempt in range(2):
+            try:
+                expected = db.session.execute(absent_count).scalar()
+                if not expected:
+                    return 0
+                record_inserts_from_select(attendance_date, AttendanceStatus.ABSENT, absent_users)
+                inserted = db.session.execute(statement).rowcount
+                if inserted == expected:
+                    db.session.commit()
+                    return inserted
+                db.session.rollback()
+            except IntegrityError:
+                db.session.rollback()
+            if attempt:
+                raise RuntimeError(f'Attendance for {attendance_date} kept changing, run mark-absent again')
+
     def get_user_attendance(self, user_id: str, start_date: date = None,
                            end_date: date = None) -> List[Dict]:
         """
@@ -193,10 +361,12 @@ class AttendanceService:
             if not record:
                 return {'error': 'Attendance record not found'}, 404
 
-            record.status = status
+            old_status = record.status
+            record.status = AttendanceStatus(status) if isinstance(status, str) else status
             if location:
                 record.location = location
 
+            record_attendance_changes([(record.user_id, record.date_only, old_status, record.status)])
             db.session.commit()
 
             return {
@@ -226,31 +396,167 @@ class AttendanceService:
         """
         results = {'successful': [], 'failed': [], 'already_marked': []}
 
-        for user_id in user_ids:
-            try:
-                # Check if already marked
-                existing = AttendanceRecord.query.filter(
-                    db.and_(AttendanceRecord.user_id == user_id, AttendanceRecord.date_only == attendance_date)
-                ).first()
+        try:
+            outcomes = self.apply_bulk('mark', user_ids, attendance_date, status=status,
+                                       location=location, source=source)
+        except Exception as e:
+            db.session.rollback()
+            results['failed'] = [{'user_id': user_id, 'error': str(e)} for user_id in user_ids]
+            return results
 
-                if existing:
-                    results['already_marked'].append(user_id)
-                    continue
+        for outcome in outcomes:
+            if outcome['status'] == 'marked':
+                results['successful'].append(outcome['user_id'])
+            elif outcome['status'] == 'already_marked':
+                results['already_marked'].append(outcome['user_id'])
+            else:
+                results['failed'].append({'user_id': outcome['user_id'], 'error': outcome['error']})
 
-                # Mark attendance
-                record = AttendanceRecord(
-                    user_id=user_id,
-                    date_only=attendance_date,
-                    status=status,
-                    location=location,
-                    source=source
-                )
+        return results
 
-                db.session.add(record)
-                results['successful'].append(user_id)
+    def apply_bulk(self, operation: str, user_ids: List[str], attendance_date: date,
+                   status=None, location: str = None, source=AttendanceSource.MANUAL,
+                   include_records: bool = False) -> List[Dict]:
+        """
+        Set-based bulk mark/update/delete of attendance for one date
 
-            except Exception as e:
-                results['failed'].append({'user_id': user_id, 'error': str(e)})
+        User IDs are processed in chunks of ATTENDANCE_BULK_CHUNK_SIZE; each
+        chunk costs one lookup query plus one INSERT (executemany), UPDATE or
+        DELETE statement instead of a query per user. Everything is committed
+        in one transaction, which is retried once if a concurrent check-in
+        makes the INSERT hit the unique constraint.
+
+        Args:
+            operation: 'mark', 'update' or 'delete'
+            user_ids: User IDs (duplicates are handled once)
+            attendance_date: Date of the records
+            status: Attendance status (mark/update)
+            location: Location (mark/update, optional)
+            source: Source for new records
+            include_records: Add 'record' to already_marked results and
+                             'record_id' to marked results
+
+        Returns:
+            One {'user_id', 'status'} dict per distinct user ID in input order;
+            status is marked/already_marked/failed (mark), updated (update),
+            deleted (delete) or not_found
+
+        Raises:
+            ValueError: Unknown operation or status
+        """
+        if operation not in ('mark', 'update', 'delete'):
+            raise ValueError(f"Unknown bulk operation: {operation}")
+        if operation == 'mark':
+            status = status or AttendanceStatus.PRESENT
+        elif operation == 'update' and not status:
+            raise ValueError('Status required for update')
+        if isinstance(status, str):
+            status = AttendanceStatus(status)
+        if isinstance(source, str):
+            source = AttendanceSource(source)
+
+        unique_ids = list(dict.fromkeys(user_ids))
+        chunk_size = Config.ATTENDANCE_BULK_CHUNK_SIZE
+
+        # A check-in committed between a chunk's lookup and its INSERT trips
+        # uq_attendance_user_date; the retry looks the records up again, so
+        # that user is reported as already_marked and the rest are marked
+        for attempt in range(2):
+            results = {}
+            try:
+                for offset in range(0, len(unique_ids), chunk_size):
+                    chunk = unique_ids[offset:offset + chunk_size]
+                    if operation == 'mark':
+                        results.update(self._bulk_mark_chunk(
+                            chunk, attendance_date, status, location, source, include_records
+                        ))
+                    else:
+                        results.update(self._bulk_change_chunk(
+                            operation, chunk, attendance_date, status, location
+                        ))
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+            except Exception:
+                db.session.rollback()
+                raise
+
+        return [results[user_id] for user_id in unique_ids]
+
+    def _bulk_mark_chunk(self, user_ids: List[str], attendance_date: date, status: AttendanceStatus,
+                         location: Optional[str], source: AttendanceSource, include_records: bool) -> Dict:
+        # One query tells which users exist and which already have a record
+        existing = dict(
+            db.session.query(User.id, AttendanceRecord).outerjoin(
+                AttendanceRecord,
+                db.and_(AttendanceRecord.user_id == User.id, AttendanceRecord.date_only == attendance_date)
+            ).filter(User.id.in_(user_ids)).all()
+        )
+
+        mark_time = datetime.now().time() if attendance_date == date.today() else None
+        results, new_rows = {}, []
+        for user_id in user_ids:
+            if user_id not in existing:
+                results[user_id] = {'user_id': user_id, 'status': 'failed', 'error': 'User not found'}
+            elif existing[user_id] is not None:
+                results[user_id] = {'user_id': user_id, 'status': 'already_marked'}
+                if include_records:
+                    results[user_id]['record'] = existing[user_id].to_dict()
+            else:
+                results[user_id] = {'user_id': user_id, 'status': 'marked'}
+                new_rows.append({
+                    'user_id': user_id,
+                    'date_only': attendance_date,
+                    'time_only': mark_time,
+                    'status': status,
+                    'location': location or 'Office',
+                    'source': source
+                })
+
+        if new_rows:
+            db.session.execute(db.insert(AttendanceRecord), new_rows)
+            record_attendance_changes(
+                (row['user_id'], attendance_date, None, status) for row in new_rows
+            )
+            if include_records:
+                record_ids = dict(db.session.query(AttendanceRecord.user_id, AttendanceRecord.id).filter(
+                    AttendanceRecord.user_id.in_([row['user_id'] for row in new_rows]),
+                    AttendanceRecord.date_only == attendance_date
+                ).all())
+                for row in new_rows:
+                    results[row['user_id']]['record_id'] = record_ids.get(row['user_id'])
 
-        db.session.commit()
         return results
+
+    def _bulk_change_chunk(self, operation: str, user_ids: List[str], attendance_date: date,
+                           status: Optional[AttendanceStatus], location: Optional[str]) -> Dict:
+        chunk_filter = db.and_(
+            AttendanceRecord.user_id.in_(user_ids),
+            AttendanceRecord.date_only == attendance_date
+        )
+        found = dict(
+            db.session.query(AttendanceRecord.user_id, AttendanceRecord.status).filter(chunk_filter).all()
+        )
+
+        if found:
+            if operation == 'update':
+                values = {'status': status}
+                if location:
+                    values['location'] = location
+                statement = db.update(AttendanceRecord).where(chunk_filter).values(**values)
+            else:
+                statement = db.delete(AttendanceRecord).where(chunk_filter)
+            db.session.execute(statement.execution_options(synchronize_session=False))
+            new_status = status if operation == 'update' else None
+            record_attendance_changes(
+                (user_id, attendance_date, old_status, new_status) for user_id, old_status in found.items()
+            )
+
+        done = 'updated' if operation == 'update' else 'deleted'
+        return {
+            user_id: {'user_id': user_id, 'status': done if user_id in found else 'not_found'}
+            for user_id in user_ids
+        }
@@ -0,0 +1,99 @@
+"""
+Binary format of FaceEncoding.encoding_vector.
+
+Version 1 blobs are one header byte followed by the 128 encoding values:
+
+    header = (FORMAT_VERSION << 4) | dtype code
+
+Legacy rows written before the header existed are the raw 1024-byte
+float64 array and are recognised by their length (a version 1 blob is
+never 1024 bytes long: 1 + 128 * itemsize).
+"""
+import numpy as np
+from config import Config
+from typing import List
+
+ENCODING_DIMENSIONS = 128
+FORMAT_VERSION = 1
+
+DTYPE_CODES = {
+    'float64': 1,
+    'float32': 2,
+    'float16': 3,
+}
+CODE_DTYPES = {code: np.dtype(name) for name, code in DTYPE_CODES.items()}
+
+LEGACY_SIZE = ENCODING_DIMENSIONS * np.dtype(np.float64).itemsize
+
+
+def encode_encoding(vector: np.ndarray, dtype: str = None) -> bytes:
+    """
+    Serialize a face encoding for storage
+
+    Args:
+        vector: 128-d encoding
+        dtype: Storage dtype (float64, float32 or float16; default FACE_ENCODING_STORAGE_DTYPE)
+    """
+    dtype = np.dtype(dtype or Config.FACE_ENCODING_STORAGE_DTYPE)
+    try:
+        code = DTYPE_CODES[dtype.name]
+    except KeyError:
+        raise ValueError(f"Unsupported encoding storage dtype: {dtype.name}")
+    header = bytes([(FORMAT_VERSION << 4) | code])
+    return header + np.asarray(vector, dtype=dtype).tobytes()
+
+
+def encoding_dtype(blob: bytes) -> np.dtype:
+    """Storage dtype of a blob (float64 for legacy rows)"""
+    if len(blob) == LEGACY_SIZE:
+        return np.dtype(np.float64)
+    version, code = blob[0] >> 4, blob[0] & 0x0F
+    if version != FORMAT_VERSION or code not in CODE_DTYPES:
+        raise ValueError(f"Unknown face encoding format header: {blob[0]:#04x}")
+    return CODE_DTYPES[code]
+
+
+def is_legacy(blob: bytes) -> bool:
+    return len(blob) == LEGACY_SIZE
+
+
+def decode_encoding(blob: bytes) -> np.ndarray:
+    """Decode a stored encoding_vector blob in either format"""
+    if is_legacy(blob):
+        return np.frombuffer(blob, dtype=np.float64)
+    return np.frombuffer(blob, dtype=encoding_dtype(blob), offset=1)
+
+
+def decode_encodings(blobs: List[bytes]) -> np.ndarray:
+    """
+    Decode many blobs into one (n, 128) matrix
+
+    Blobs sharing a format are decoded with a single frombuffer call over
+    their concatenation, so loading a gallery does not loop in Python per row.
+    """
+    if not blobs:
+        return np.empty((0, ENCODING_DIMENSIONS))
+
+    formats = {}
+    for row, blob in enumerate(blobs):
+        key = 'legacy' if is_legacy(blob) else blob[0]
+        formats.setdefault(key, []).append(row)
+
+    result_dtype = np.result_type(*(
+        np.float64 if key == 'legacy' else encoding_dtype(blobs[rows[0]])
+        for key, rows in formats.items()
+    ))
+    result = np.empty((len(blobs), ENCODING_DIMENSIONS), dtype=result_dtype)
+
+    for key, rows in formats.items():
+        raw = np.frombuffer(b''.join(blobs[row] for row in rows), dtype=np.uint8)
+        if key == 'legacy':
+            values = raw.view(np.float64).reshape(len(rows), ENCODING_DIMENSIONS)
+        else:
+            dtype = encoding_dtype(blobs[rows[0]])
+            width = 1 + ENCODING_DIMENSIONS * dtype.itemsize
+            # Drop each row's header byte, then reinterpret the payload
+            values = raw.reshape(len(rows), width)[:, 1:].copy().view(dtype)
+        result[rows] = values
+
+    return result
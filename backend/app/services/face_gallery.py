@@ -0,0 +1,461 @@
+import logging
+import threading
+import time
+import numpy as np
+from sqlalchemy import event, inspect, select, update, insert, cast, Integer, String
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import db
+from app.models.face_encoding import FaceEncoding, FaceEncodingStatus
+from app.models.system_config import SystemConfig
+from app.services.face_encoding_format import ENCODING_DIMENSIONS, decode_encoding, decode_encodings
+from app.services.face_gallery_snapshot import read_snapshot, write_snapshot
+from app.services.face_index import ExactIndex, create_index, squared_distances
+from config import Config
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# system_config row used as a cross-worker change counter for the gallery
+GALLERY_VERSION_KEY = 'face_gallery_version'
+
+
+def read_gallery_version(connection=None) -> int:
+    """Read the shared gallery version counter (0 if never bumped)"""
+    connection = connection or db.session.connection()
+    value = connection.execute(
+        select(SystemConfig.config_value).where(SystemConfig.config_key == GALLERY_VERSION_KEY)
+    ).scalar()
+    return int(value) if value is not None else 0
+
+
+def bump_gallery_version(connection) -> int:
+    """Increment the shared gallery version counter inside the current transaction"""
+    table = SystemConfig.__table__
+    increment = (
+        update(table)
+        .where(table.c.config_key == GALLERY_VERSION_KEY)
+        .values(config_value=cast(cast(table.c.config_value, Integer) + 1, String))
+    )
+    if connection.execute(increment).rowcount == 0:
+        # The row is seeded by schema.sql; databases without it create it on
+        # first use. A concurrent first bump may win the INSERT, so it runs in
+        # a savepoint and a duplicate key falls back to the increment instead
+        # of aborting the caller's transaction.
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(table).values(
+                    config_key=GALLERY_VERSION_KEY,
+                    config_value='1',
+                    data_type='number',
+                    description='Incremented whenever verified face encodings change',
+                    is_editable=False,
+                    category='face_recognition'
+                ))
+        except IntegrityError:
+            connection.execute(increment)
+    return read_gallery_version(connection)
+
+
+class FaceGallery:
+    """
+    Process-resident gallery of verified face encodings.
+
+    Encodings are held in one contiguous matrix with parallel arrays of
+    user IDs and encoding IDs, so a probe is answered with a single vectorized
+    distance computation instead of a table scan per request.
+
+    Rows are added, replaced or removed individually as encodings change
+    (see the session listeners below). Other worker processes notice changes
+    through the version counter in system_config and reload.
+
+    An optional index (see face_index) shortlists rows for large galleries;
+    the shortlist is always re-ranked with exact distances.
+
+    With a snapshot_dir the matrix is loaded from a memory-mapped snapshot
+    shared by all workers (see face_gallery_snapshot) when its version is
+    current; otherwise it is read from the database and a new snapshot is
+    published. A mapped matrix is read-only, so the first local change
+    copies it into private memory. After incremental changes the snapshot
+    is republished by a background thread, at most once per snapshot_delay
+    seconds; until then other workers reload from the database when they
+    see the new version.
+    """
+
+    def __init__(self, dtype=np.float64, version_check_interval: float = 0.0, index=None,
+                 snapshot_dir: str = None, snapshot_delay: float = 0.0):
+        self.dtype = np.dtype(dtype)
+        self.index = index or ExactIndex()
+        self.version_check_interval = version_check_interval
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_delay = snapshot_delay
+        self._lock = threading.RLock()
+        self._publish_lock = threading.Lock()
+        self._snapshot_due = None
+        self._publisher = None
+        self._loaded = False
+        self._last_version_check = 0.0
+        self.version = 0
+        self._reset(0)
+
+    def _reset(self, capacity: int):
+        self._size = 0
+        self._buffer = np.empty((max(capacity, 1), ENCODING_DIMENSIONS), dtype=self.dtype)
+        self._user_ids = np.empty(max(capacity, 1), dtype=object)
+        self._encoding_ids = np.empty(max(capacity, 1), dtype=object)
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, encoding_id: str) -> bool:
+        return encoding_id in self._rows
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def encodings(self) -> np.ndarray:
+        return self._buffer[:self._size]
+
+    @property
+    def user_ids(self) -> np.ndarray:
+        return self._user_ids[:self._size]
+
+    @property
+    def encoding_ids(self) -> np.ndarray:
+        return self._encoding_ids[:self._size]
+
+    def load(self) -> int:
+        """
+        (Re)load all verified encodings
+
+        Uses the shared snapshot when it matches the current gallery version.
+        Otherwise only the columns needed for matching are selected from the
+        database (no ORM objects are hydrated) and a fresh snapshot is written.
+
+        Returns:
+            Number of encodings loaded
+        """
+        version = read_gallery_version()
+
+        snapshot = read_snapshot(self.snapshot_dir, self.dtype) if self.snapshot_dir else None
+        if snapshot is not None and snapshot['version'] == version:
+            with self._lock:
+                self._install(snapshot['encodings'], snapshot['user_ids'], snapshot['encoding_ids'], version)
+            return len(self)
+
+        rows = db.session.query(
+            FaceEncoding.id,
+            FaceEncoding.user_id,
+            FaceEncoding.encoding_vector
+        ).filter(FaceEncoding.status == FaceEncodingStatus.VERIFIED).all()
+
+        with self._lock:
+            self._install(
+                decode_encodings([row.encoding_vector for row in rows]).astype(self.dtype, copy=False),
+                [row.user_id for row in rows],
+                [row.id for row in rows],
+                version
+            )
+
+        self.save_snapshot()
+        return len(rows)
+
+    def _install(self, encodings: np.ndarray, user_ids: list, encoding_ids: list, version: int):
+        size = len(encoding_ids)
+        self._size = size
+        self._buffer = encodings if size else np.empty((1, ENCODING_DIMENSIONS), dtype=self.dtype)
+        self._user_ids = np.empty(max(size, 1), dtype=object)
+        self._user_ids[:size] = user_ids
+        self._encoding_ids = np.empty(max(size, 1), dtype=object)
+        self._encoding_ids[:size] = encoding_ids
+        self._rows = {encoding_id: index for index, encoding_id in enumerate(encoding_ids)}
+        self.index.build(self.encodings, self.user_ids)
+        self.version = version
+        self._loaded = True
+        self._last_version_check = time.monotonic()
+
+    def save_snapshot(self) -> bool:
+        """Publish the current matrix as the shared snapshot (if configured)"""
+        if not self.snapshot_dir:
+            return False
+        with self._lock:
+            if not self._loaded:
+                return False
+            version = self.version
+            encodings = np.array(self.encodings)
+            user_ids = self.user_ids.tolist()
+            encoding_ids = self.encoding_ids.tolist()
+        try:
+            return write_snapshot(self.snapshot_dir, version, encodings, user_ids, encoding_ids)
+        except OSError as e:
+            logger.warning('Could not write face gallery snapshot: %s', e)
+            return False
+
+    def schedule_snapshot(self):
+        """Republish the snapshot from a background thread after snapshot_delay"""
+        if not self.snapshot_dir:
+            return
+        with self._publish_lock:
+            if self._snapshot_due is None:
+                self._snapshot_due = time.monotonic() + self.snapshot_delay
+            if self._publisher is None:
+                self._publisher = threading.Thread(target=self._publish_pending, name='face-gallery-snapshot',
+                                                   daemon=True)
+                self._publisher.start()
+
+    def _publish_pending(self):
+        while True:
+            with self._publish_lock:
+                due = self._snapshot_due
+                if due is None:
+                    self._publisher = None
+                    return
+                delay = due - time.monotonic()
+                if delay <= 0:
+                    self._snapshot_due = None
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            try:
+                self.save_snapshot()
+            except Exception:
+                logger.exception('Face gallery snapshot publisher failed')
+
+    def ensure_loaded(self):
+        """Load the gallery on first use"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+    def refresh(self):
+        """
+        Reload if another process changed the gallery
+
+        Compares the local version with the shared counter at most once per
+        version_check_interval seconds.
+        """
+        if not self._loaded:
+            self.ensure_loaded()
+            return
+
+        now = time.monotonic()
+        if now - self._last_version_check < self.version_check_interval:
+            return
+
+        self._last_version_check = now
+        if read_gallery_version() != self.version:
+            self.load()
+
+    def invalidate(self):
+        """Force a full reload on next use"""
+        with self._lock:
+            self._loaded = False
+
+    def _make_writable(self):
+        # Copy-on-write for a matrix mapped from the snapshot
+        if not self._buffer.flags.writeable:
+            self._buffer = np.array(self._buffer)
+
+    def upsert(self, encoding_id: str, user_id: str, vector: np.ndarray):
+        """Add an encoding, or replace it in place if already present"""
+        with self._lock:
+            self._make_writable()
+            index = self._rows.get(encoding_id)
+            if index is None:
+                if self._size == self._buffer.shape[0]:
+                    self._grow()
+                index = self._size
+                self._size += 1
+                self._rows[encoding_id] = index
+                self._encoding_ids[index] = encoding_id
+            self._buffer[index] = vector
+            self._user_ids[index] = user_id
+            self.index.assign(index, self._buffer[index], user_id)
+
+    def remove(self, encoding_id: str) -> bool:
+        """Remove an encoding by moving the last row into its slot"""
+        with self._lock:
+            index = self._rows.pop(encoding_id, None)
+            if index is None:
+                return False
+            self._make_writable()
+            last = self._size - 1
+            self.index.remove(index)
+            if index != last:
+                self._buffer[index] = self._buffer[last]
+                self._user_ids[index] = self._user_ids[last]
+                self._encoding_ids[index] = self._encoding_ids[last]
+                self._rows[self._encoding_ids[index]] = index
+                self.index.move(last, index)
+            self._user_ids[last] = None
+            self._encoding_ids[last] = None
+            self._size = last
+            return True
+
+    def _grow(self):
+        capacity = self._buffer.shape[0] * 2
+        buffer = np.empty((capacity, ENCODING_DIMENSIONS), dtype=self.dtype)
+        buffer[:self._size] = self._buffer[:self._size]
+        user_ids = np.empty(capacity, dtype=object)
+        user_ids[:self._size] = self._user_ids[:self._size]
+        encoding_ids = np.empty(capacity, dtype=object)
+        encoding_ids[:self._size] = self._encoding_ids[:self._size]
+        self._buffer, self._user_ids, self._encoding_ids = buffer, user_ids, encoding_ids
+
+    def apply_changes(self, changes: list, start_version: int, end_version: int):
+        """
+        Apply committed row changes from this process and republish the
+        snapshot
+
+        If the local copy was not at start_version another process changed the
+        gallery in the meantime, so fall back to a full reload.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            if self.version != start_version:
+                self._loaded = False
+                return
+            for action, encoding_id, user_id, vector in changes:
+                if action == 'upsert':
+                    self.upsert(encoding_id, user_id, vector)
+                else:
+                    self.remove(encoding_id)
+            self.version = end_version
+
+        self.schedule_snapshot()
+
+    def distances(self, probe: np.ndarray) -> np.ndarray:
+        """Euclidean distance from probe to every gallery encoding"""
+        self.refresh()
+        with self._lock:
+            if self._size == 0:
+                return np.empty(0, dtype=self.dtype)
+            return np.linalg.norm(self.encodings - np.asarray(probe, dtype=self.dtype), axis=1)
+
+    def best_match(self, probe: np.ndarray) -> Optional[Tuple[str, str, float]]:
+        """
+        Find the closest gallery encoding to probe
+
+        Returns:
+            Tuple of (user_id, encoding_id, distance) or None if the gallery is empty
+        """
+        self.refresh()
+        probe = np.asarray(probe, dtype=self.dtype)
+        with self._lock:
+            if self._size == 0:
+                return None
+
+            if self.index.needs_rebuild(self._size):
+                self.index.build(self.encodings, self.user_ids)
+
+            rows = self.index.candidates(probe, self.encodings)
+            if rows is None or rows.size == 0:
+                rows = slice(0, self._size)
+            else:
+                rows = np.asarray(rows)
+
+            # Exact re-ranking over the shortlist
+            face_distances = np.linalg.norm(self._buffer[rows] - probe, axis=1)
+            best = int(np.argmin(face_distances))
+            best_index = best if isinstance(rows, slice) else int(rows[best])
+            return self._user_ids[best_index], self._encoding_ids[best_index], float(face_distances[best])
+
+    def best_matches(self, probes: np.ndarray) -> List[Optional[Tuple[str, str, float]]]:
+        """
+        Find the closest gallery encoding for each of many probes
+
+        All probe-to-gallery distances come from one matrix product, which is
+        much cheaper than matching probes one by one.
+
+        Returns:
+            One (user_id, encoding_id, distance) tuple per probe, or None
+            entries if the gallery is empty
+        """
+        self.refresh()
+        probes = np.atleast_2d(np.asarray(probes, dtype=self.dtype))
+        with self._lock:
+            if self._size == 0:
+                return [None] * probes.shape[0]
+
+            face_distances = np.sqrt(squared_distances(probes, self.encodings))
+            best_indexes = np.argmin(face_distances, axis=1)
+            return [
+                (self._user_ids[index], self._encoding_ids[index], float(face_distances[probe, index]))
+                for probe, index in enumerate(best_indexes)
+            ]
+
+
+# Shared by every FaceService instance in this process
+face_gallery = FaceGallery(
+    dtype=Config.FACE_GALLERY_DTYPE,
+    version_check_interval=Config.FACE_GALLERY_VERSION_CHECK_SECONDS,
+    snapshot_dir=Config.FACE_GALLERY_SNAPSHOT_DIR,
+    snapshot_delay=Config.FACE_GALLERY_SNAPSHOT_DELAY,
+    index=create_index(Config.FACE_INDEX_BACKEND, **Config.FACE_INDEX_OPTIONS.get(Config.FACE_INDEX_BACKEND, {}))
+)
+
+
+# ---------------------------------------------------------------------------
+# Change notification: keep the gallery in step with FaceEncoding writes
+# ---------------------------------------------------------------------------
+
+def _is_verified(status) -> bool:
+    return status in (FaceEncodingStatus.VERIFIED, FaceEncodingStatus.VERIFIED.value)
+
+
+def _collect_changes(session) -> list:
+    changes = []
+
+    for obj in session.new:
+        if isinstance(obj, FaceEncoding) and _is_verified(obj.status):
+            changes.append(('upsert', obj.id, obj.user_id, decode_encoding(obj.encoding_vector)))
+
+    for obj in session.dirty:
+        if not isinstance(obj, FaceEncoding):
+            continue
+        state = inspect(obj)
+        if not (state.attrs.status.history.has_changes()
+                or state.attrs.encoding_vector.history.has_changes()
+                or state.attrs.user_id.history.has_changes()):
+            continue
+        if _is_verified(obj.status):
+            changes.append(('upsert', obj.id, obj.user_id, decode_encoding(obj.encoding_vector)))
+        else:
+            changes.append(('remove', obj.id, None, None))
+
+    for obj in session.deleted:
+        if isinstance(obj, FaceEncoding):
+            changes.append(('remove', obj.id, None, None))
+
+    return changes
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_face_encoding_changes(session, flush_context):
+    changes = _collect_changes(session)
+    if not changes:
+        return
+
+    pending = session.info.setdefault('face_gallery_changes', {'changes': [], 'start_version': None})
+    version = bump_gallery_version(session.connection())
+    if pending['start_version'] is None:
+        pending['start_version'] = version - 1
+    pending['end_version'] = version
+    pending['changes'].extend(changes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_face_encoding_changes(session):
+    pending = session.info.pop('face_gallery_changes', None)
+    if pending:
+        face_gallery.apply_changes(pending['changes'], pending['start_version'], pending['end_version'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_face_encoding_changes(session):
+    session.info.pop('face_gallery_changes', None)
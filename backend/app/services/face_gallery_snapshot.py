@@ -0,0 +1,105 @@
+"""
+On-disk snapshot of the face gallery shared by every worker process.
+
+A snapshot is a plain .npy matrix of encodings plus a JSON sidecar with the
+gallery version and the user/encoding IDs of each row. Workers open the
+matrix with np.load(mmap_mode='r'), so they all share one page-cache copy
+and start up without reading encodings from the database.
+
+Writes are atomic: the matrix goes to a new versioned file and the sidecar
+(which names that file) is replaced last with os.replace, so a reader
+never pairs a matrix with the wrong IDs.
+"""
+import glob
+import json
+import os
+import numpy as np
+from typing import Dict, Optional
+
+SIDECAR_NAME = 'gallery.json'
+
+
+def _sidecar_path(directory: str) -> str:
+    return os.path.join(directory, SIDECAR_NAME)
+
+
+def read_snapshot_version(directory: str) -> Optional[int]:
+    """Version recorded in the current sidecar, or None without a snapshot"""
+    try:
+        with open(_sidecar_path(directory)) as sidecar:
+            return json.load(sidecar)['version']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def read_snapshot(directory: str, dtype) -> Optional[Dict]:
+    """
+    Open the current snapshot
+
+    Returns:
+        Dict with version, encodings (read-only memory map), user_ids and
+        encoding_ids, or None if there is no usable snapshot of this dtype
+    """
+    try:
+        with open(_sidecar_path(directory)) as sidecar:
+            meta = json.load(sidecar)
+        if np.dtype(meta['dtype']) != np.dtype(dtype):
+            return None
+        encodings = np.load(os.path.join(directory, meta['file']), mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+
+    if encodings.shape[0] != len(meta['encoding_ids']):
+        return None
+
+    return {
+        'version': meta['version'],
+        'encodings': encodings,
+        'user_ids': meta['user_ids'],
+        'encoding_ids': meta['encoding_ids']
+    }
+
+
+def write_snapshot(directory: str, version: int, encodings: np.ndarray, user_ids, encoding_ids) -> bool:
+    """
+    Atomically publish a snapshot
+
+    Skipped if the directory already holds a snapshot of this or a newer
+    version (another worker got there first).
+
+    Returns:
+        True if the snapshot was written
+    """
+    current = read_snapshot_version(directory)
+    if current is not None and current >= version:
+        return False
+
+    os.makedirs(directory, exist_ok=True)
+    suffix = f'{os.getpid()}.tmp'
+    file_name = f'gallery-{version}.npy'
+
+    matrix_tmp = os.path.join(directory, f'{file_name}.{suffix}')
+    with open(matrix_tmp, 'wb') as matrix_file:
+        np.save(matrix_file, np.ascontiguousarray(encodings))
+    os.replace(matrix_tmp, os.path.join(directory, file_name))
+
+    sidecar_tmp = f'{_sidecar_path(directory)}.{suffix}'
+    with open(sidecar_tmp, 'w') as sidecar:
+        json.dump({
+            'version': version,
+            'dtype': np.dtype(encodings.dtype).name,
+            'file': file_name,
+            'user_ids': list(user_ids),
+            'encoding_ids': list(encoding_ids)
+        }, sidecar)
+    os.replace(sidecar_tmp, _sidecar_path(directory))
+
+    # Older matrices can go: workers that still map them keep their pages
+    # until they reload
+    for path in glob.glob(os.path.join(directory, 'gallery-*.npy')):
+        if os.path.basename(path) != file_name:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return True
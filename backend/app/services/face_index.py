@@ -0,0 +1,289 @@
+"""
+Search indexes for the face gallery.
+
+An index only narrows down which gallery rows are worth comparing against a
+probe; FaceGallery always re-ranks the returned shortlist with exact
+distances. Indexes track gallery rows by position, so FaceGallery tells them
+whenever a row is written (assign), dropped (remove) or moved by a
+swap-remove (move).
+"""
+import numpy as np
+from typing import Dict, List, Optional
+
+
+class ExactIndex:
+    """Exhaustive search: every row is a candidate"""
+
+    name = 'exact'
+
+    def __init__(self, **options):
+        pass
+
+    def build(self, encodings: np.ndarray, user_ids: np.ndarray):
+        pass
+
+    def needs_rebuild(self, size: int) -> bool:
+        return False
+
+    def assign(self, row: int, vector: np.ndarray, user_id: str):
+        pass
+
+    def remove(self, row: int):
+        pass
+
+    def move(self, src: int, dst: int):
+        pass
+
+    def candidates(self, probe: np.ndarray, encodings: np.ndarray) -> Optional[np.ndarray]:
+        """Row indices to re-rank, or None for all rows"""
+        return None
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file index with k-means coarse quantization.
+
+    Rows are bucketed by their nearest of nlist centroids. A probe is
+    compared with the centroids first and only rows in the nprobe closest
+    buckets are re-ranked exactly, so nprobe is the recall/latency knob:
+    nprobe == nlist is equivalent to exhaustive search.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, nlist: int = 256, nprobe: int = 8, min_train_size: int = None,
+                 kmeans_iterations: int = 10, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        # Below this many rows exhaustive search is already cheap
+        self.min_train_size = min_train_size if min_train_size is not None else nlist * 8
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+        self._assignments = np.empty(0, dtype=np.int32)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def build(self, encodings: np.ndarray, user_ids: np.ndarray = None):
+        """Train centroids on encodings and bucket every row"""
+        size = encodings.shape[0]
+        if size < self.min_train_size:
+            self.centroids = None
+            self.trained_size = 0
+            return
+
+        self.centroids = self._kmeans(encodings)
+        self.trained_size = size
+        self._assignments = np.empty(max(size, 1) * 2, dtype=np.int32)
+        self._assignments[:size] = self._nearest_centroids(encodings)
+
+    def needs_rebuild(self, size: int) -> bool:
+        """Retrain once the gallery has doubled (or become big enough to train)"""
+        if not self.trained:
+            return size >= self.min_train_size
+        return size > self.trained_size * 2
+
+    def assign(self, row: int, vector: np.ndarray, user_id: str = None):
+        if not self.trained:
+            return
+        if row >= self._assignments.shape[0]:
+            grown = np.empty(max(row + 1, self._assignments.shape[0] * 2), dtype=np.int32)
+            grown[:self._assignments.shape[0]] = self._assignments
+            self._assignments = grown
+        self._assignments[row] = self._nearest_centroids(vector[np.newaxis, :])[0]
+
+    def remove(self, row: int):
+        pass
+
+    def move(self, src: int, dst: int):
+        if self.trained:
+            self._assignments[dst] = self._assignments[src]
+
+    def candidates(self, probe: np.ndarray, encodings: np.ndarray) -> Optional[np.ndarray]:
+        if not self.trained or self.nprobe >= self.centroids.shape[0]:
+            return None
+        centroid_distances = squared_distances(probe[np.newaxis, :], self.centroids)[0]
+        probed = np.argpartition(centroid_distances, self.nprobe - 1)[:self.nprobe]
+        return np.flatnonzero(np.isin(self._assignments[:encodings.shape[0]], probed))
+
+    def _nearest_centroids(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmin(squared_distances(vectors, self.centroids), axis=1).astype(np.int32)
+
+    def _kmeans(self, encodings: np.ndarray) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        nlist = min(self.nlist, encodings.shape[0])
+
+        # Training on a bounded sample keeps rebuilds fast for large galleries
+        sample_size = min(encodings.shape[0], nlist * 64)
+        sample = encodings[rng.choice(encodings.shape[0], sample_size, replace=False)].astype(np.float64)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            labels = np.argmin(squared_distances(sample, centroids), axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, np.newaxis]
+            # Re-seed empty clusters from random sample points
+            if not filled.all():
+                centroids[~filled] = sample[rng.choice(sample_size, int((~filled).sum()), replace=False)]
+
+        return centroids.astype(encodings.dtype)
+
+
+class CentroidIndex:
+    """
+    Two-stage matcher over per-user centroids.
+
+    Every user's encodings are summarised by their mean (centroid) and the
+    largest member distance from it (radius). Stage one compares the probe
+    with one centroid per user and ranks users by the triangle-inequality
+    lower bound max(0, |probe - centroid| - radius); stage two (the exact
+    re-rank in FaceGallery) only visits the encodings of the top_k users.
+    With 5-7 encodings per user this is roughly 6x fewer distance
+    computations than exhaustive search.
+    """
+
+    name = 'centroid'
+
+    def __init__(self, top_k: int = 10):
+        self.top_k = top_k
+        self._reset()
+
+    def _reset(self):
+        self._slots: Dict[str, int] = {}
+        self._members: List[List[int]] = []
+        self._centroids = np.empty((0, 0))
+        self._radii = np.empty(0)
+        self._active = np.empty(0, dtype=bool)
+        self._row_slots = np.empty(0, dtype=np.int64)
+        self._dirty = set()
+
+    def build(self, encodings: np.ndarray, user_ids: np.ndarray):
+        """Group rows by user and compute every centroid and radius"""
+        self._reset()
+        size = encodings.shape[0]
+        self._row_slots = np.full(max(size, 1) * 2, -1, dtype=np.int64)
+        for row, user_id in enumerate(user_ids):
+            slot = self._slot_for(user_id)
+            self._members[slot].append(row)
+            self._row_slots[row] = slot
+
+        slots = len(self._members)
+        self._centroids = np.zeros((slots, encodings.shape[1]), dtype=encodings.dtype)
+        self._radii = np.zeros(slots, dtype=encodings.dtype)
+        self._active = np.zeros(slots, dtype=bool)
+        if size == 0:
+            return
+
+        labels = self._row_slots[:size]
+        counts = np.bincount(labels, minlength=slots)
+        np.add.at(self._centroids, labels, encodings)
+        self._centroids /= counts[:, np.newaxis]
+        member_distances = np.linalg.norm(encodings - self._centroids[labels], axis=1)
+        np.maximum.at(self._radii, labels, member_distances)
+        self._active[:] = counts > 0
+
+    def needs_rebuild(self, size: int) -> bool:
+        return False
+
+    def assign(self, row: int, vector: np.ndarray, user_id: str):
+        if row >= self._row_slots.shape[0]:
+            grown = np.full(max(row + 1, self._row_slots.shape[0] * 2), -1, dtype=np.int64)
+            grown[:self._row_slots.shape[0]] = self._row_slots
+            self._row_slots = grown
+        if self._row_slots[row] >= 0:
+            self.remove(row)
+        slot = self._slot_for(user_id)
+        self._members[slot].append(row)
+        self._row_slots[row] = slot
+        self._dirty.add(slot)
+
+    def remove(self, row: int):
+        slot = int(self._row_slots[row])
+        if slot < 0:
+            return
+        self._members[slot].remove(row)
+        self._row_slots[row] = -1
+        self._dirty.add(slot)
+
+    def move(self, src: int, dst: int):
+        slot = int(self._row_slots[src])
+        if slot < 0:
+            return
+        members = self._members[slot]
+        members[members.index(src)] = dst
+        self._row_slots[dst] = slot
+        self._row_slots[src] = -1
+
+    def candidates(self, probe: np.ndarray, encodings: np.ndarray) -> Optional[np.ndarray]:
+        if self._dirty:
+            self._refresh_dirty(encodings)
+        if not self._active.any() or self.top_k >= int(self._active.sum()):
+            return None
+
+        # Stage one: one distance per user
+        centroid_distances = np.linalg.norm(self._centroids - probe, axis=1)
+        lower_bounds = np.where(self._active, np.maximum(centroid_distances - self._radii, 0.0), np.inf)
+        top_slots = np.argpartition(lower_bounds, self.top_k - 1)[:self.top_k]
+        return np.fromiter(
+            (row for slot in top_slots for row in self._members[slot]), dtype=np.int64
+        )
+
+    def _slot_for(self, user_id: str) -> int:
+        slot = self._slots.get(user_id)
+        if slot is None:
+            slot = len(self._members)
+            self._slots[user_id] = slot
+            self._members.append([])
+        return slot
+
+    def _refresh_dirty(self, encodings: np.ndarray):
+        slots = len(self._members)
+        if self._centroids.shape[0] < slots:
+            grow = max(slots, self._centroids.shape[0] * 2)
+            centroids = np.zeros((grow, encodings.shape[1]), dtype=encodings.dtype)
+            centroids[:self._centroids.shape[0]] = self._centroids
+            radii = np.zeros(grow, dtype=encodings.dtype)
+            radii[:self._radii.shape[0]] = self._radii
+            active = np.zeros(grow, dtype=bool)
+            active[:self._active.shape[0]] = self._active
+            self._centroids, self._radii, self._active = centroids, radii, active
+
+        for slot in self._dirty:
+            members = self._members[slot]
+            if not members:
+                self._active[slot] = False
+                continue
+            vectors = encodings[members]
+            centroid = vectors.mean(axis=0)
+            self._centroids[slot] = centroid
+            self._radii[slot] = np.linalg.norm(vectors - centroid, axis=1).max()
+            self._active[slot] = True
+        self._dirty.clear()
+
+
+def squared_distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise squared Euclidean distances via one matrix product"""
+    distances = (a * a).sum(axis=1)[:, np.newaxis] - 2.0 * (a @ b.T) + (b * b).sum(axis=1)[np.newaxis, :]
+    return np.maximum(distances, 0.0, out=distances)
+
+
+FACE_INDEX_BACKENDS = {
+    ExactIndex.name: ExactIndex,
+    IVFFlatIndex.name: IVFFlatIndex,
+    CentroidIndex.name: CentroidIndex,
+}
+
+
+def create_index(backend: str, **options):
+    """Create a gallery index by backend name (see FACE_INDEX_BACKENDS)"""
+    try:
+        index_class = FACE_INDEX_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown face index backend: {backend}")
+    return index_class(**options)
@@ -0,0 +1,381 @@
+"""
+Image preprocessing shared by the face routes and FaceService.
+
+HOG detection cost grows with pixel count, so images are decoded at a
+bounded working resolution (JPEGs are downscaled in the DCT domain with
+Image.draft), faces are detected on a further downscaled copy, and the
+detected boxes are mapped back to the working image for encoding.
+
+analyze_face is the single-pass variant used for enrollment: one decode and
+one detection, with the landmarks fitted for the encoding reused for the
+quality checks.
+"""
+import hashlib
+import io
+import math
+import os
+import time
+import numpy as np
+from PIL import Image
+from config import Config
+from typing import Dict, List, Optional, Tuple
+
+# face_recognition loads the dlib models when imported (about a second and
+# ~100 MB per process), so it is only imported on first use or by
+# load_face_models (see FACE_MODELS_PRELOAD)
+_face_recognition = None
+
+
+def get_face_recognition():
+    """Import face_recognition on first use (ImportError if not installed)"""
+    global _face_recognition
+    if _face_recognition is None:
+        import face_recognition
+        _face_recognition = face_recognition
+    return _face_recognition
+
+
+def face_recognition_available() -> bool:
+    try:
+        get_face_recognition()
+        return True
+    except ImportError:
+        return False
+
+
+def load_face_models() -> bool:
+    """
+    Load the dlib detector, landmark and encoder models in this process
+
+    Runs each model once on a blank image so everything is resident before
+    the first request (or before gunicorn forks its workers).
+
+    Returns:
+        False if face_recognition is not installed
+    """
+    if not face_recognition_available():
+        return False
+    face_recognition = get_face_recognition()
+    image = np.zeros((64, 64, 3), dtype=np.uint8)
+    face_recognition.face_locations(image)
+    face_recognition.face_encodings(image, [(0, 63, 63, 0)])
+    return True
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _bounded_size(size: Tuple[int, int], max_side: int) -> Tuple[int, int]:
+    width, height = size
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_image(source, encode_max_side: int = None, detect_max_side: int = None) -> Dict:
+    """
+    Decode an image and build the detection copy
+
+    Args:
+        source: File path or file-like object
+        encode_max_side: Longest side of the working image used for encoding (0 = full size)
+        detect_max_side: Longest side of the image used for detection (0 = same as working image)
+
+    Returns:
+        Dict with the working PIL image, its RGB array, the detection array,
+        the detection-to-working scale factor and per-stage timings (ms)
+    """
+    if encode_max_side is None:
+        encode_max_side = Config.FACE_ENCODE_MAX_SIDE
+    if detect_max_side is None:
+        detect_max_side = Config.FACE_DETECT_MAX_SIDE
+
+    timings = {}
+
+    start = time.perf_counter()
+    pil_image = Image.open(source)
+    if pil_image.format == 'JPEG' and encode_max_side:
+        # Let libjpeg skip DCT coefficients instead of decoding every pixel
+        pil_image.draft('RGB', _bounded_size(pil_image.size, encode_max_side))
+    pil_image = pil_image.convert('RGB')
+    timings['decode'] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    working_size = _bounded_size(pil_image.size, encode_max_side)
+    if working_size != pil_image.size:
+        pil_image = pil_image.resize(working_size, Image.BILINEAR)
+    image = np.asarray(pil_image)
+
+    detect_size = _bounded_size(pil_image.size, detect_max_side)
+    if detect_size != pil_image.size:
+        detect_image = np.asarray(pil_image.resize(detect_size, Image.BILINEAR))
+    else:
+        detect_image = image
+    timings['resize'] = _elapsed_ms(start)
+
+    return {
+        'pil_image': pil_image,
+        'image': image,
+        'detect_image': detect_image,
+        'scale': pil_image.size[0] / detect_size[0],
+        'timings': timings
+    }
+
+
+def detect_faces(prepared: Dict, upsample: int = None) -> List[Tuple[int, int, int, int]]:
+    """
+    Detect faces on the detection copy and map boxes to the working image
+
+    Returns:
+        Face locations as (top, right, bottom, left) in working-image pixels
+    """
+    if upsample is None:
+        upsample = Config.FACE_DETECT_UPSAMPLE
+
+    start = time.perf_counter()
+    locations = get_face_recognition().face_locations(
+        prepared['detect_image'], number_of_times_to_upsample=upsample
+    )
+    mapped = _to_working_image(prepared, locations)
+    prepared['timings']['detect'] = _elapsed_ms(start)
+    return mapped
+
+
+def _to_working_image(prepared: Dict, locations: list) -> List[Tuple[int, int, int, int]]:
+    """Scale (top, right, bottom, left) boxes from the detection copy to the working image"""
+    scale = prepared['scale']
+    height, width = prepared['image'].shape[:2]
+    return [
+        (
+            max(0, int(round(top * scale))),
+            min(width, int(round(right * scale))),
+            min(height, int(round(bottom * scale))),
+            max(0, int(round(left * scale)))
+        )
+        for top, right, bottom, left in locations
+    ]
+
+
+def encode_faces(prepared: Dict, locations: List[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+    """Compute 128-d encodings for the given boxes on the working image"""
+    start = time.perf_counter()
+    encodings = get_face_recognition().face_encodings(prepared['image'], locations)
+    prepared['timings']['encode'] = _elapsed_ms(start)
+    return encodings
+
+
+def process_image(source, max_faces: Optional[int] = None, return_image: bool = False) -> Dict:
+    """
+    Run the whole pipeline on one image
+
+    Returns only small, picklable results so it can run in a worker process.
+
+    Args:
+        source: Image bytes, file path or file-like object
+        max_faces: Encode at most this many of the detected faces (None = all)
+        return_image: Also return the working image as JPEG bytes
+
+    Returns:
+        Dict with face locations, encodings, working image size and timings
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    prepared = prepare_image(source)
+    locations = detect_faces(prepared)
+    to_encode = locations if max_faces is None else locations[:max_faces]
+    encodings = encode_faces(prepared, to_encode) if to_encode else []
+
+    result = {
+        'locations': locations,
+        'encodings': encodings,
+        'image_size': prepared['image'].shape[:2],
+        'timings': prepared['timings']
+    }
+
+    if return_image:
+        buffer = io.BytesIO()
+        prepared['pil_image'].save(buffer, format='JPEG', quality=90)
+        result['image_bytes'] = buffer.getvalue()
+
+    return result
+
+
+# Quality thresholds used by analyze_face
+MIN_FACE_SIZE = 100
+MAX_CENTER_OFFSET = 0.3
+MAX_ROLL_DEGREES = 20
+
+
+def _dlib_api():
+    """face_recognition's dlib models, or None if they are not exposed"""
+    api = getattr(get_face_recognition(), 'api', None)
+    if api is None or not all(hasattr(api, name) for name in (
+            'face_detector', 'pose_predictor_5_point', 'face_encoder')):
+        return None
+    return api
+
+
+def _detect_with_scores(prepared: Dict, upsample: int) -> Tuple[list, list]:
+    """Detect faces and keep the HOG detector's per-box scores"""
+    api = _dlib_api()
+    if api is None:
+        return detect_faces(prepared, upsample), []
+
+    start = time.perf_counter()
+    rects, scores, _ = api.face_detector.run(prepared['detect_image'], upsample, 0.0)
+    locations = _to_working_image(
+        prepared, [(rect.top(), rect.right(), rect.bottom(), rect.left()) for rect in rects]
+    )
+    prepared['timings']['detect'] = _elapsed_ms(start)
+    return locations, list(scores)
+
+
+def _landmarks_and_encoding(image: np.ndarray, location: Tuple[int, int, int, int]) -> Tuple[Dict, np.ndarray]:
+    """
+    Fit the 5-point landmarks once and compute the encoding from them
+
+    face_recognition.face_encodings would fit the same landmarks again
+    internally, so the dlib models are called directly when available.
+    """
+    api = _dlib_api()
+    if api is None:
+        face_recognition = get_face_recognition()
+        landmarks = face_recognition.face_landmarks(image, [location], model='small')
+        encodings = face_recognition.face_encodings(image, [location])
+        return (landmarks[0] if landmarks else {}), (encodings[0] if encodings else None)
+
+    import dlib
+
+    top, right, bottom, left = location
+    shape = api.pose_predictor_5_point(image, dlib.rectangle(left, top, right, bottom))
+    encoding = np.array(api.face_encoder.compute_face_descriptor(image, shape, 1))
+    points = [(point.x, point.y) for point in shape.parts()]
+    landmarks = {
+        'nose_tip': [points[4]],
+        'left_eye': points[2:4],
+        'right_eye': points[0:2]
+    }
+    return landmarks, encoding
+
+
+def _detector_confidence(score: Optional[float]) -> Optional[float]:
+    """Map a HOG detector score (0 at the detection threshold) onto 0..1"""
+    if score is None:
+        return None
+    return round(1.0 / (1.0 + math.exp(-2.0 * score)), 4)
+
+
+def _quality_metrics(location: Tuple[int, int, int, int], image_size: Tuple[int, int],
+                     landmarks: Dict) -> Tuple[Dict, List[str]]:
+    top, right, bottom, left = location
+    image_height, image_width = image_size
+    metrics = {
+        'face_width': right - left,
+        'face_height': bottom - top,
+        'center_offset_x': round(((left + right) / 2 - image_width / 2) / image_width, 4),
+        'center_offset_y': round(((top + bottom) / 2 - image_height / 2) / image_height, 4)
+    }
+
+    issues = []
+    if metrics['face_width'] < MIN_FACE_SIZE or metrics['face_height'] < MIN_FACE_SIZE:
+        issues.append('Face too small')
+    if abs(metrics['center_offset_x']) > MAX_CENTER_OFFSET:
+        issues.append('Face not centered horizontally')
+    if abs(metrics['center_offset_y']) > MAX_CENTER_OFFSET:
+        issues.append('Face not centered vertically')
+
+    left_eye, right_eye = landmarks.get('left_eye'), landmarks.get('right_eye')
+    if left_eye and right_eye:
+        left_x, left_y = np.mean(left_eye, axis=0)
+        right_x, right_y = np.mean(right_eye, axis=0)
+        roll = math.degrees(math.atan2(left_y - right_y, left_x - right_x))
+        metrics['roll_degrees'] = round(roll, 2)
+        if abs(roll) > MAX_ROLL_DEGREES:
+            issues.append('Face tilted')
+
+    return metrics, issues
+
+
+def analyze_face(source, return_image: bool = False) -> Dict:
+    """
+    Single-pass analysis of an enrollment image
+
+    The image is decoded and searched once; the landmarks fitted for the
+    encoding are reused for quality checks, and the detector score becomes
+    the face confidence. Like process_image it only returns picklable
+    results so it can run in a worker process.
+
+    Args:
+        source: Image bytes, file path or file-like object
+        return_image: Also return the working image as JPEG bytes
+
+    Returns:
+        Dict with face_count, locations, and for exactly one face its
+        location, encoding, landmarks, face_confidence, quality metrics,
+        issues and quality_score (0 when there is not exactly one usable face)
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    prepared = prepare_image(source)
+    locations, scores = _detect_with_scores(prepared, Config.FACE_DETECT_UPSAMPLE)
+    image_size = prepared['image'].shape[:2]
+
+    result = {
+        'face_count': len(locations),
+        'locations': locations,
+        'location': None,
+        'encoding': None,
+        'landmarks': None,
+        'face_confidence': None,
+        'metrics': {},
+        'issues': [],
+        'quality_score': 0,
+        'image_size': image_size,
+        'timings': prepared['timings']
+    }
+
+    if len(locations) == 0:
+        result['issues'] = ['No face detected']
+    elif len(locations) > 1:
+        result['issues'] = ['Multiple faces detected']
+    else:
+        start = time.perf_counter()
+        landmarks, encoding = _landmarks_and_encoding(prepared['image'], locations[0])
+        prepared['timings']['encode'] = _elapsed_ms(start)
+
+        result['location'] = locations[0]
+        result['landmarks'] = landmarks
+        result['face_confidence'] = _detector_confidence(scores[0] if scores else None)
+        if encoding is None:
+            result['issues'] = ['Could not encode face']
+        else:
+            metrics, issues = _quality_metrics(locations[0], image_size, landmarks)
+            result.update({
+                'encoding': encoding,
+                'metrics': metrics,
+                'issues': issues,
+                'quality_score': max(0.0, 1.0 - len(issues) * 0.2)
+            })
+
+    if return_image:
+        buffer = io.BytesIO()
+        prepared['pil_image'].save(buffer, format='JPEG', quality=90)
+        result['image_bytes'] = buffer.getvalue()
+
+    return result
+
+
+def image_hash(image_bytes: bytes) -> str:
+    """SHA-256 hex digest of uploaded image bytes (FaceEncoding.image_hash)"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def save_image_bytes(image_bytes: bytes, image_path: str):
+    """Write encoded image bytes, creating the parent directory"""
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    with open(image_path, 'wb') as image_file:
+        image_file.write(image_bytes)
@@ -1,12 +1,13 @@
 import numpy as np
-try:
-    import face_recognition
-    FACE_RECOGNITION_AVAILABLE = True
-except ImportError:
-    FACE_RECOGNITION_AVAILABLE = False
+from datetime import datetime
 from app import db
 from app.models.face_encoding import FaceEncoding, FaceEncodingStatus
 from app.models.user import User
+from app.services.face_gallery import face_gallery
+from app.services.face_encoding_format import encode_encoding
+from app.services.face_pipeline import image_hash
+from app.services.face_worker import face_worker
+from app.utils.helpers import generate_face_encoding_id
 from config import Config
 from typing import Dict, List, Tuple, Optional
 
@@ -15,6 +16,7 @@ class FaceService:
 
     def __init__(self):
         self.threshold = Config.FACE_RECOGNITION_THRESHOLD
+        self.gallery = face_gallery
 
     def recognize_face(self, unknown_encoding: np.ndarray, threshold: float = None) -> Dict:
         """
@@ -30,45 +32,62 @@ class FaceService:
         if threshold is None:
             threshold = self.threshold
 
-        # Get all verified face encodings
-        verified_encodings = FaceEncoding.query.filter_by(status=FaceEncodingStatus.VERIFIED).all()
+        match = self.gallery.best_match(unknown_encoding)
 
-        if not verified_encodings:
+        if match is None:
             return {
                 'recognized': False,
                 'message': 'No verified face encodings in database'
             }
 
-        # Extract encodings and user IDs
-        known_encodings = []
-        user_ids = []
-        encoding_ids = []
+        user = User.query.get(match[0]) if match[2] <= threshold else None
+        return self._match_result(match, threshold, user.name if user else 'Unknown')
 
-        for enc in verified_encodings:
-            encoding_vector = np.frombuffer(enc.encoding_vector, dtype=np.float64)
-            known_encodings.append(encoding_vector)
-            user_ids.append(enc.user_id)
-            encoding_ids.append(enc.id)
+    def recognize_faces_batch(self, unknown_encodings: np.ndarray, threshold: float = None) -> List[Dict]:
+        """
+        Recognize many faces at once
 
-        # Convert to numpy arrays
-        known_encodings = np.array(known_encodings)
+        Distances to every gallery encoding are computed with one matrix
+        product and user names are fetched with one query.
 
-        # Calculate face distances
-        face_distances = face_recognition.face_distance(known_encodings, unknown_encoding)
+        Args:
+            unknown_encodings: Array of face encodings (one row per face)
+            threshold: Recognition threshold (optional)
 
-        # Find best match
-        best_match_index = np.argmin(face_distances)
-        best_distance = face_distances[best_match_index]
+        Returns:
+            List of recognition results in the same shape as recognize_face
+        """
+        if threshold is None:
+            threshold = self.threshold
 
-        if best_distance <= threshold:
-            user_id = user_ids[best_match_index]
-            user = User.query.get(user_id)
+        matches = self.gallery.best_matches(unknown_encodings)
+
+        matched_user_ids = {match[0] for match in matches if match and match[2] <= threshold}
+        user_names = dict(
+            db.session.query(User.id, User.name).filter(User.id.in_(matched_user_ids)).all()
+        ) if matched_user_ids else {}
 
+        results = []
+        for match in matches:
+            if match is None:
+                results.append({
+                    'recognized': False,
+                    'message': 'No verified face encodings in database'
+                })
+            else:
+                results.append(self._match_result(match, threshold, user_names.get(match[0], 'Unknown')))
+        return results
+
+    def _match_result(self, match: Tuple[str, str, float], threshold: float, user_name: str) -> Dict:
+        """Build a recognition result from a (user_id, encoding_id, distance) match"""
+        user_id, encoding_id, best_distance = match
+
+        if best_distance <= threshold:
             return {
                 'recognized': True,
                 'user_id': user_id,
-                'user_name': user.name if user else 'Unknown',
-                'face_encoding_id': encoding_ids[best_match_index],
+                'user_name': user_name,
+                'face_encoding_id': encoding_id,
                 'confidence': 1.0 - best_distance,  # Convert distance to confidence
                 'distance': best_distance
             }
@@ -79,36 +98,56 @@ class FaceService:
                 'best_distance': best_distance
             }
 
-    def enroll_face(self, user_id: str, image_path: str) -> Tuple[bool, str]:
+    def analyze_face(self, image, return_image: bool = False) -> Dict:
+        """
+        Decode, detect, encode and quality-check an image in one pass
+
+        Args:
+            image: Image bytes or path
+            return_image: Also return the working image as JPEG bytes
+
+        Returns:
+            Analysis dict (see face_pipeline.analyze_face); pass it on to
+            enroll_face / verify_face_quality instead of analysing again
+        """
+        return face_worker.analyze_face(image, return_image=return_image)
+
+    def enroll_face(self, user_id: str, image_path: str, analysis: Dict = None) -> Tuple[bool, str]:
         """
         Enroll a new face for a user
 
         Args:
             user_id: User ID
             image_path: Path to face image
+            analysis: Result of analyze_face for this image (optional)
 
         Returns:
             Tuple of (success, message)
         """
         try:
-            # Load and process image
-            image = face_recognition.load_image_file(image_path)
-            face_locations = face_recognition.face_locations(image)
+            with open(image_path, 'rb') as image_file:
+                image_bytes = image_file.read()
+
+            # The user's exact re-uploads are rejected before any face processing
+            upload_hash = image_hash(image_bytes)
+            if db.session.query(FaceEncoding.id).filter(
+                FaceEncoding.image_hash == upload_hash,
+                FaceEncoding.user_id == user_id
+            ).first():
+                return False, "This image has already been enrolled"
+
+            if analysis is None:
+                analysis = self.analyze_face(image_bytes)
 
-            if len(face_locations) == 0:
+            if analysis['face_count'] == 0:
                 return False, "No face detected in image"
 
-            if len(face_locations) > 1:
+            if analysis['face_count'] > 1:
                 return False, "Multiple faces detected. Please provide image with single face"
 
-            # Get face encoding
-            face_encodings = face_recognition.face_encodings(image, face_locations)
-
-            if len(face_encodings) == 0:
+            if analysis['encoding'] is None:
                 return False, "Could not encode face"
 
-            encoding = face_encodings[0]
-
             # Check if user already has maximum encodings
             verified_count = FaceEncoding.query.filter_by(
                 user_id=user_id,
@@ -120,9 +159,14 @@ class FaceService:
 
             # Save encoding to database
             face_encoding = FaceEncoding(
+                id=generate_face_encoding_id(user_id),
                 user_id=user_id,
-                encoding_vector=encoding.tobytes(),
+                encoding_vector=encode_encoding(analysis['encoding']),
                 image_url=image_path,
+                image_hash=upload_hash,
+                captured_at=datetime.utcnow(),
+                quality_score=analysis['quality_score'],
+                face_confidence=analysis['face_confidence'],
                 status=FaceEncodingStatus.PENDING
             )
 
@@ -135,64 +179,32 @@ class FaceService:
             db.session.rollback()
             return False, f"Error enrolling face: {str(e)}"
 
-    def verify_face_quality(self, image_path: str) -> Dict:
+    def verify_face_quality(self, image_path: str, analysis: Dict = None) -> Dict:
         """
         Verify face image quality
 
         Args:
             image_path: Path to face image
+            analysis: Result of analyze_face for this image (optional)
 
         Returns:
             Dict with quality metrics
         """
         try:
-            image = face_recognition.load_image_file(image_path)
-            face_locations = face_recognition.face_locations(image)
-
-            if len(face_locations) == 0:
-                return {'quality_score': 0, 'issues': ['No face detected']}
-
-            if len(face_locations) > 1:
-                return {'quality_score': 0, 'issues': ['Multiple faces detected']}
-
-            # Get face encoding to check if face is clear
-            face_encodings = face_recognition.face_encodings(image, face_locations)
-
-            if len(face_encodings) == 0:
-                return {'quality_score': 0, 'issues': ['Could not encode face']}
-
-            # Basic quality checks
-            top, right, bottom, left = face_locations[0]
-            face_width = right - left
-            face_height = bottom - top
-
-            issues = []
-
-            # Check face size (should be at least 100x100 pixels)
-            if face_width < 100 or face_height < 100:
-                issues.append('Face too small')
-
-            # Check if face is centered (basic check)
-            image_height, image_width = image.shape[:2]
-            face_center_x = (left + right) / 2
-            face_center_y = (top + bottom) / 2
-
-            if abs(face_center_x - image_width/2) > image_width * 0.3:
-                issues.append('Face not centered horizontally')
-
-            if abs(face_center_y - image_height/2) > image_height * 0.3:
-                issues.append('Face not centered vertically')
+            if analysis is None:
+                analysis = self.analyze_face(image_path)
 
-            # Calculate quality score
-            quality_score = 1.0
-            if issues:
-                quality_score -= len(issues) * 0.2
-                quality_score = max(0, quality_score)
+            if analysis['encoding'] is None:
+                return {'quality_score': 0, 'issues': analysis['issues']}
 
             return {
-                'quality_score': quality_score,
-                'issues': issues,
-                'face_location': face_locations[0]
+                'quality_score': analysis['quality_score'],
+                'issues': analysis['issues'],
+                'face_location': analysis['location'],
+                'face_confidence': analysis['face_confidence'],
+                'landmarks': analysis['landmarks'],
+                'metrics': analysis['metrics'],
+                'timings_ms': analysis['timings']
             }
 
         except Exception as e:
@@ -204,6 +216,10 @@ class FaceService:
 
     def delete_user_encodings(self, user_id: str) -> int:
         """Delete all face encodings for a user"""
-        deleted_count = FaceEncoding.query.filter_by(user_id=user_id).delete()
+        # Delete through the session (not a bulk query delete) so the
+        # recognition gallery is notified about each removed encoding
+        encodings = FaceEncoding.query.filter_by(user_id=user_id).all()
+        for encoding in encodings:
+            db.session.delete(encoding)
         db.session.commit()
-        return deleted_count
+        return len(encodings)
@@ -0,0 +1,243 @@
+"""
+Process pool for dlib face detection and encoding.
+
+HOG detection and the ResNet encoder hold the GIL for hundreds of
+milliseconds per image, so running them in the request thread stalls the
+whole gunicorn worker. Jobs are sent to a ProcessPoolExecutor whose
+processes load the dlib models once at start-up.
+
+Backpressure: at most processes + FACE_WORKER_QUEUE_SIZE jobs may be in
+flight; further submissions fail fast with FaceWorkerBusy so routes can
+answer 503 with Retry-After instead of queueing without bound. Every job
+also has a timeout (FACE_WORKER_TIMEOUT).
+
+With FACE_WORKER_PROCESSES=0 jobs run inline in the calling thread.
+
+Recognition results for raw uploaded bytes are remembered in a small LRU
+keyed by the image hash, so a kiosk re-sending the same frame on a network
+retry is answered without touching the pool.
+"""
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from app.services import face_pipeline
+from config import Config
+
+
+class FaceWorkerBusy(Exception):
+    """Raised when the face worker queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Face processing queue is full, retry shortly')
+        self.retry_after = retry_after
+
+
+class FaceWorkerTimeout(Exception):
+    """Raised when a face job does not finish in time"""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Face processing timed out')
+        self.retry_after = retry_after
+
+
+class ResultCache:
+    """Thread-safe LRU of image hash -> processed image result"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class FaceWorkerPool:
+    """Bounded process pool for face jobs"""
+
+    def __init__(self, processes: int, queue_size: int, timeout: float, retry_after: int,
+                 result_cache_size: int = 0):
+        self.processes = processes
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.results = ResultCache(result_cache_size)
+        # Jobs that may be running or queued at once
+        self.capacity = max(processes, 1) + queue_size
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so each gunicorn worker gets its own pool after fork.
+        # 'spawn' avoids forking a process that already holds threads and DB sockets.
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.processes,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=face_pipeline.load_face_models
+                    )
+        return self._executor
+
+    def run(self, fn, *args, timeout: float = None, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the pool and wait for the result
+
+        Raises:
+            FaceWorkerBusy: if the queue is full
+            FaceWorkerTimeout: if the job takes longer than timeout seconds
+        """
+        if self.processes <= 0:
+            return fn(*args, **kwargs)
+
+        if not self._slots.acquire(blocking=False):
+            raise FaceWorkerBusy(self.retry_after)
+
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=timeout if timeout is not None else self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise FaceWorkerTimeout(self.retry_after)
+
+    def run_many(self, fn, arg_list: list, timeout: float = None, **kwargs) -> list:
+        """
+        Run fn(arg, **kwargs) for every arg in parallel and wait for all results
+
+        Jobs are submitted in waves: as many as there are free queue slots,
+        then one more each time a job finishes, so a batch larger than the
+        free capacity still completes. FaceWorkerBusy is raised only when no
+        slot is free for the next job while none of the batch is running.
+        """
+        if self.processes <= 0:
+            return [fn(arg, **kwargs) for arg in arg_list]
+
+        executor = self._get_executor()
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        results = [None] * len(arg_list)
+        pending = list(enumerate(arg_list))
+        running = {}
+        try:
+            while pending or running:
+                while pending and self._slots.acquire(blocking=False):
+                    index, arg = pending.pop(0)
+                    try:
+                        future = executor.submit(fn, arg, **kwargs)
+                    except Exception:
+                        self._slots.release()
+                        raise
+                    future.add_done_callback(lambda _: self._slots.release())
+                    running[future] = index
+                if not running:
+                    raise FaceWorkerBusy(self.retry_after)
+
+                # The timeout applies to the batch as a whole
+                done, _ = wait(running, timeout=max(0.0, deadline - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    raise FaceWorkerTimeout(self.retry_after)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        finally:
+            for future in running:
+                future.cancel()
+        return results
+
+    def process_image(self, source, max_faces: int = None, return_image: bool = False,
+                      use_cache: bool = False) -> dict:
+        """
+        Detect and encode faces in an image (see face_pipeline.process_image)
+
+        With use_cache, results for raw image bytes are looked up in and
+        stored to the result cache; cached results are flagged 'cached' and
+        carry no timings.
+        """
+        key = self._cache_key(source, max_faces) if use_cache and not return_image else None
+        if key is not None:
+            cached = self.results.get(key)
+            if cached is not None:
+                return dict(cached, timings={}, cached=True)
+
+        result = self.run(face_pipeline.process_image, source, max_faces=max_faces, return_image=return_image)
+        if key is not None:
+            self.results.put(key, result)
+        return result
+
+    def analyze_face(self, source, return_image: bool = False) -> dict:
+        """Single-pass enrollment analysis (see face_pipeline.analyze_face)"""
+        return self.run(face_pipeline.analyze_face, source, return_image=return_image)
+
+    def process_images(self, sources: list, max_faces: int = None, use_cache: bool = False) -> list:
+        """Detect and encode faces in several images in parallel"""
+        if not use_cache:
+            return self.run_many(face_pipeline.process_image, sources, max_faces=max_faces)
+
+        keys = [self._cache_key(source, max_faces) for source in sources]
+        results = []
+        for key in keys:
+            cached = self.results.get(key) if key is not None else None
+            results.append(dict(cached, timings={}, cached=True) if cached is not None else None)
+
+        # Only images that were not cached go to the pool
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            processed = self.run_many(
+                face_pipeline.process_image, [sources[index] for index in missing], max_faces=max_faces
+            )
+            for index, result in zip(missing, processed):
+                results[index] = result
+                if keys[index] is not None:
+                    self.results.put(keys[index], result)
+        return results
+
+    @staticmethod
+    def _cache_key(source, max_faces):
+        if not isinstance(source, (bytes, bytearray)):
+            return None
+        return face_pipeline.image_hash(source), max_faces
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+face_worker = FaceWorkerPool(
+    processes=Config.FACE_WORKER_PROCESSES,
+    queue_size=Config.FACE_WORKER_QUEUE_SIZE,
+    timeout=Config.FACE_WORKER_TIMEOUT,
+    retry_after=Config.FACE_WORKER_RETRY_AFTER,
+    result_cache_size=Config.FACE_RESULT_CACHE_SIZE
+)
@@ -1,11 +1,61 @@
+import csv
+import glob
+import hashlib
+import io
+import json
 import pandas as pd
 from datetime import datetime, date
 from app import db
 from app.models.attendance import AttendanceRecord
 from app.models.user import User
 from app.models.department import Department
+from app.models.report import Report, ReportFormat, ReportStatus
 import os
+import time
+import uuid
 from config import Config
+from typing import Callable, Iterator, List, Optional, Tuple
+
+ATTENDANCE_REPORT_COLUMNS = ['Date', 'User ID', 'Name', 'Email', 'Department', 'Time', 'Status', 'Location', 'Source']
+REPORT_TYPES = ('attendance', 'users', 'departments')
+EXPORT_FORMATS = ('csv', 'excel', 'parquet')
+FILE_EXTENSIONS = {'csv': 'csv', 'excel': 'xlsx', 'parquet': 'parquet'}
+# Rows per worksheet including the header row (Excel's hard limit)
+EXCEL_MAX_ROWS = 1_048_576
+# Rows buffered per Parquet row group (a few MB of columnar data)
+PARQUET_ROW_GROUP_SIZE = 100_000
+
+
+def get_pyarrow():
+    """
+    Import pyarrow on first use (optional dependency, only Parquet exports need it)
+
+    Raises:
+        ValueError: pyarrow is not installed
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError('Parquet export requires the pyarrow package')
+    return pyarrow
+
+
+def _attendance_arrow_schema(pa):
+    # Low-cardinality columns are dictionary-encoded: one small dictionary
+    # per row group plus integer codes instead of repeated strings
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('Date', pa.date32()),
+        ('User ID', pa.string()),
+        ('Name', pa.string()),
+        ('Email', pa.string()),
+        ('Department', category),
+        ('Time', pa.time64('us')),
+        ('Status', category),
+        ('Location', pa.string()),
+        ('Source', category)
+    ])
 
 class ReportService:
     """Service for generating various reports"""
@@ -48,6 +98,188 @@ class ReportService:
 
         return pd.DataFrame(data)
 
+    def _attendance_report_statement(self, start_date: date, end_date: date,
+                                     department: str = None, user_id: str = None):
+        """Column-only SELECT of the attendance report, in ATTENDANCE_REPORT_COLUMNS order"""
+        statement = db.select(
+            AttendanceRecord.date_only,
+            AttendanceRecord.user_id,
+            User.name,
+            User.email,
+            db.func.coalesce(Department.name, User.department),
+            AttendanceRecord.time_only,
+            AttendanceRecord.status,
+            AttendanceRecord.location,
+            AttendanceRecord.source
+        ).join(User, AttendanceRecord.user_id == User.id
+        ).outerjoin(Department, User.department == Department.id
+        ).where(AttendanceRecord.date_only.between(start_date, end_date))
+
+        if department:
+            statement = statement.where(User.department == department)
+        if user_id:
+            statement = statement.where(AttendanceRecord.user_id == user_id)
+
+        return statement.order_by(AttendanceRecord.date_only, User.name)
+
+    def iter_attendance_report(self, start_date: date, end_date: date, department: str = None,
+                               user_id: str = None, chunk_size: int = None) -> Iterator[list]:
+        """
+        Stream the attendance report as lists of row tuples
+
+        Rows come from a column-only query fetched with yield_per (a
+        server-side cursor where the driver supports it), so memory holds
+        one chunk of plain tuples at a time, without ORM objects.
+        """
+        chunk_size = chunk_size or Config.REPORT_EXPORT_CHUNK_SIZE
+        result = db.session.execute(
+            self._attendance_report_statement(start_date, end_date, department, user_id)
+            .execution_options(yield_per=chunk_size)
+        )
+        try:
+            for rows in result.partitions():
+                yield [
+                    (day, row_user_id, name, email, department_name, time_only,
+                     status.value, location, source.value if source else None)
+                    for day, row_user_id, name, email, department_name, time_only, status, location, source in rows
+                ]
+        finally:
+            result.close()
+
+    def stream_attendance_csv(self, start_date: date, end_date: date, department: str = None,
+                              user_id: str = None, chunk_size: int = None) -> Iterator[str]:
+        """Attendance report as CSV text, one piece per chunk of rows (header first)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(ATTENDANCE_REPORT_COLUMNS)
+        yield buffer.getvalue()
+
+        for rows in self.iter_attendance_report(start_date, end_date, department, user_id, chunk_size):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+
+    def count_attendance_report(self, start_date: date, end_date: date,
+                                department: str = None, user_id: str = None) -> int:
+        """Number of rows the attendance report will have"""
+        statement = self._attendance_report_statement(start_date, end_date, department, user_id).order_by(None)
+        return db.session.execute(db.select(db.func.count()).select_from(statement.subquery())).scalar()
+
+    def export_attendance_csv(self, start_date: date, end_date: date, filename: str,
+                              department: str = None, user_id: str = None,
+                              progress: Optional[Callable[[int], None]] = None) -> Tuple[str, int]:
+        """
+        Write the attendance report to a CSV file chunk by chunk
+
+        Args:
+            progress: Called with the percentage done after each chunk
+
+        Returns:
+            Tuple of (file path, record count)
+        """
+        filepath = os.path.join(Config.UPLOAD_FOLDER, 'reports', filename)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        record_count = 0
+        with open(filepath, 'w', newline='', encoding='utf-8') as report_file:
+            writer = csv.writer(report_file, lineterminator='\n')
+            writer.writerow(ATTENDANCE_REPORT_COLUMNS)
+            for rows in self._iter_with_progress(start_date, end_date, department, user_id, progress):
+                writer.writerows(rows)
+                record_count += len(rows)
+
+        return filepath, record_count
+
+    def export_attendance_excel(self, start_date: date, end_date: date, filename: str,
+                                department: str = None, user_id: str = None,
+                                progress: Optional[Callable[[int], None]] = None,
+                                max_rows: int = EXCEL_MAX_ROWS) -> Tuple[str, int]:
+        """
+        Write the attendance report to an Excel file from the streaming query
+
+        Uses openpyxl's write-only workbook, which flushes each row to disk
+        instead of keeping a cell tree in memory. When a sheet reaches
+        max_rows (header included) the report continues on a new sheet
+        named 'Attendance (2)', 'Attendance (3)', ... with its own header.
+
+        Returns:
+            Tuple of (file path, record count)
+        """
+        from openpyxl import Workbook
+
+        filepath = os.path.join(Config.UPLOAD_FOLDER, 'reports', filename)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        workbook = Workbook(write_only=True)
+        sheet, sheet_rows, sheets = None, max_rows, 0
+        record_count = 0
+        for rows in self._iter_with_progress(start_date, end_date, department, user_id, progress):
+            for row in rows:
+                if sheet_rows >= max_rows:
+                    sheets += 1
+                    sheet = workbook.create_sheet('Attendance' if sheets == 1 else f'Attendance ({sheets})')
+                    sheet.append(ATTENDANCE_REPORT_COLUMNS)
+                    sheet_rows = 1
+                sheet.append(row)
+                sheet_rows += 1
+            record_count += len(rows)
+
+        if sheet is None:
+            workbook.create_sheet('Attendance').append(ATTENDANCE_REPORT_COLUMNS)
+        workbook.save(filepath)
+        return filepath, record_count
+
+    def export_attendance_parquet(self, start_date: date, end_date: date, filename: str,
+                                  department: str = None, user_id: str = None,
+                                  progress: Optional[Callable[[int], None]] = None) -> Tuple[str, int]:
+        """
+        Write the attendance report to a Parquet file from the streaming query
+
+        Each chunk of rows becomes an Arrow record batch, with Department,
+        Status and Source dictionary-encoded. Batches are written as
+        zstd-compressed row groups of about PARQUET_ROW_GROUP_SIZE rows, so
+        memory stays bounded by one row group.
+
+        Returns:
+            Tuple of (file path, record count)
+        """
+        pa = get_pyarrow()
+        filepath = os.path.join(Config.UPLOAD_FOLDER, 'reports', filename)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        schema = _attendance_arrow_schema(pa)
+        record_count = 0
+        pending, pending_rows = [], 0
+        with pa.parquet.ParquetWriter(filepath, schema, compression='zstd') as writer:
+            for rows in self._iter_with_progress(start_date, end_date, department, user_id, progress):
+                columns = list(zip(*rows))
+                pending.append(pa.record_batch([
+                    pa.array(values, type=field.type.value_type).dictionary_encode()
+                    if pa.types.is_dictionary(field.type) else pa.array(values, type=field.type)
+                    for values, field in zip(columns, schema)
+                ], schema=schema))
+                pending_rows += len(rows)
+                record_count += len(rows)
+                if pending_rows >= PARQUET_ROW_GROUP_SIZE:
+                    writer.write_table(pa.Table.from_batches(pending, schema=schema))
+                    pending, pending_rows = [], 0
+            if pending:
+                writer.write_table(pa.Table.from_batches(pending, schema=schema))
+
+        return filepath, record_count
+
+    def _iter_with_progress(self, start_date: date, end_date: date, department: str = None,
+                            user_id: str = None, progress: Optional[Callable[[int], None]] = None):
+        """iter_attendance_report, reporting the percentage done after each chunk"""
+        total = self.count_attendance_report(start_date, end_date, department, user_id) if progress else 0
+        done = 0
+        for rows in self.iter_attendance_report(start_date, end_date, department, user_id):
+            yield rows
+            done += len(rows)
+            if progress and total:
+                progress(min(99, done * 100 // total))
+
     def generate_user_report(self, department: str = None, status: str = None) -> pd.DataFrame:
         """Generate user report"""
 
@@ -128,8 +360,177 @@ class ReportService:
         df.to_excel(filepath, index=False, engine='openpyxl')
         return filepath
 
+    def export_to_parquet(self, df: pd.DataFrame, filename: str) -> str:
+        """Export DataFrame to Parquet file"""
+        pa = get_pyarrow()
+        filepath = os.path.join(Config.UPLOAD_FOLDER, 'reports', filename)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        pa.parquet.write_table(pa.Table.from_pandas(df, preserve_index=False), filepath, compression='zstd')
+        return filepath
+
+    def validate_report_request(self, report_type: str, start_date: str = None,
+                                end_date: str = None, filters: dict = None):
+        """
+        Check a report request before it is queued
+
+        Raises:
+            ValueError: Unknown type or format, or missing/invalid dates
+        """
+        filters = filters or {}
+        if report_type not in REPORT_TYPES:
+            raise ValueError(f"Unknown report type: {report_type}")
+        if filters.get('format', 'csv') not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {filters.get('format')}")
+        if filters.get('format') == 'parquet':
+            get_pyarrow()
+        if report_type == 'attendance':
+            if not start_date or not end_date:
+                raise ValueError("Start date and end date required for attendance reports")
+            datetime.fromisoformat(start_date)
+            datetime.fromisoformat(end_date)
+
+    def _data_watermark(self, period: Optional[List[date]]) -> list:
+        """
+        Version of the data a report reads, in one statement of scalar
+        subqueries: latest updated_at plus row count (which catches deletes)
+        of users, departments and, for a period, its attendance records
+        """
+        def aggregate(model, *conditions):
+            return [
+                db.select(db.func.max(model.updated_at)).where(*conditions).scalar_subquery(),
+                db.select(db.func.count()).select_from(model).where(*conditions).scalar_subquery()
+            ]
+
+        columns = aggregate(User) + aggregate(Department)
+        if period:
+            columns += aggregate(AttendanceRecord, AttendanceRecord.date_only.between(*period))
+        return list(db.session.execute(db.select(*columns)).one())
+
+    def report_cache_key(self, report_type: str, start_date: str = None,
+                         end_date: str = None, filters: dict = None) -> str:
+        """
+        Content address of a report: SHA-256 of the type, the normalized
+        period and filters, and the data watermark. Requests that would
+        produce the same file get the same key.
+        """
+        filters = {key: value for key, value in (filters or {}).items() if value not in (None, '')}
+        filters.setdefault('format', 'csv')
+
+        if report_type == 'attendance':
+            period = [datetime.fromisoformat(start_date).date(), datetime.fromisoformat(end_date).date()]
+        elif report_type == 'departments':
+            # Always today's figures, whatever dates were sent
+            period = [date.today(), date.today()]
+        else:
+            period = None
+
+        payload = json.dumps({
+            'type': report_type,
+            'period': period,
+            'filters': filters,
+            'watermark': self._data_watermark(period)
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def find_cached_report(self, cache_key: str) -> Optional[Report]:
+        """Queued, running or unexpired completed report with this cache key"""
+        now = datetime.utcnow()
+        candidates = Report.query.filter(
+            Report.cache_key == cache_key,
+            Report.status.in_([ReportStatus.PENDING, ReportStatus.RUNNING, ReportStatus.COMPLETED]),
+            db.or_(Report.expires_at.is_(None), Report.expires_at > now)
+        ).order_by(Report.created_at.desc()).all()
+
+        for report in candidates:
+            if report.status != ReportStatus.COMPLETED:
+                return report
+            if report.file_path and os.path.exists(report.file_path):
+                return report
+        return None
+
+    def create_report_job(self, user_id: str, report_type: str, start_date: str = None,
+                          end_date: str = None, filters: dict = None) -> Tuple[Report, bool]:
+        """
+        Queue a report: insert a PENDING row into reports for the report worker,
+        unless an identical report over unchanged data is already queued or
+        available
+
+        Returns:
+            Tuple of (report, reused) where reused is True for an existing report
+
+        Raises:
+            ValueError: Invalid request (see validate_report_request)
+        """
+        filters = filters or {}
+        self.validate_report_request(report_type, start_date, end_date, filters)
+
+        cache_key = self.report_cache_key(report_type, start_date, end_date, filters)
+        cached = self.find_cached_report(cache_key)
+        if cached is not None:
+            return cached, True
+
+        period = f" {start_date} to {end_date}" if start_date and end_date else ''
+        report = Report(
+            id=f"RPT_{uuid.uuid4().hex[:16].upper()}",
+            user_id=user_id,
+            report_type=report_type,
+            title=f"{report_type.capitalize()} report{period}",
+            filters={'start_date': start_date, 'end_date': end_date, **filters},
+            file_format=ReportFormat(filters.get('format', 'csv')),
+            cache_key=cache_key,
+            status=ReportStatus.PENDING,
+            progress=0
+        )
+        db.session.add(report)
+        db.session.commit()
+        return report, False
+
+    def evict_expired_reports(self) -> int:
+        """
+        Delete report files past their expires_at, and files under
+        UPLOAD_FOLDER/reports that no report references once they are older
+        than REPORT_CACHE_TTL_HOURS. Report rows are kept, without a file.
+
+        Returns:
+            Number of files deleted
+        """
+        now = datetime.utcnow()
+        expired = Report.query.filter(
+            Report.expires_at <= now,
+            Report.file_path.isnot(None)
+        ).all()
+
+        paths = []
+        for report in expired:
+            paths.append(report.file_path)
+            report.file_path = None
+        db.session.commit()
+
+        report_dir = os.path.join(Config.UPLOAD_FOLDER, 'reports')
+        referenced = {
+            os.path.abspath(path) for (path,) in
+            db.session.query(Report.file_path).filter(Report.file_path.isnot(None)).all()
+        }
+        orphan_before = time.time() - Config.REPORT_CACHE_TTL_HOURS * 3600
+        for path in glob.glob(os.path.join(report_dir, '*')):
+            if (os.path.isfile(path) and os.path.abspath(path) not in referenced
+                    and os.path.getmtime(path) < orphan_before):
+                paths.append(path)
+
+        deleted = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError:
+                pass
+        return deleted
+
     def generate_report(self, report_type: str, start_date: str = None,
-                       end_date: str = None, filters: dict = None) -> dict:
+                       end_date: str = None, filters: dict = None,
+                       progress: Optional[Callable[[int], None]] = None,
+                       filename: str = None) -> dict:
         """
         Generate report based on type
 
@@ -138,12 +539,21 @@ class ReportService:
             start_date: Start date for attendance reports
             end_date: End date for attendance reports
             filters: Additional filters
+            progress: Called with the percentage done (streamed CSV exports)
+            filename: File name without extension (default type and timestamp)
 
         Returns:
             Dict with report data and download URL
         """
         filters = filters or {}
 
+        # Generate filename
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = filename or f"{report_type}_report_{timestamp}"
+
+        # Export format
+        export_format = filters.get('format', 'csv')
+
         if report_type == 'attendance':
             if not start_date or not end_date:
                 raise ValueError("Start date and end date required for attendance reports")
@@ -151,6 +561,29 @@ class ReportService:
             start = datetime.fromisoformat(start_date).date()
             end = datetime.fromisoformat(end_date).date()
 
+            streaming_exports = {
+                'csv': self.export_attendance_csv,
+                'excel': self.export_attendance_excel,
+                'parquet': self.export_attendance_parquet
+            }
+            if export_format in streaming_exports:
+                # Streamed straight to disk, never held in memory as a whole
+                extension = FILE_EXTENSIONS[export_format]
+                filepath, record_count = streaming_exports[export_format](
+                    start, end, f"{filename}.{extension}",
+                    department=filters.get('department'),
+                    user_id=filters.get('user_id'),
+                    progress=progress
+                )
+                return {
+                    'report_id': f"{report_type}_{timestamp}",
+                    'filename': filename,
+                    'format': export_format,
+                    'download_url': f"/downloads/reports/{filename}.{extension}",
+                    'filepath': filepath,
+                    'record_count': record_count
+                }
+
             df = self.generate_attendance_report(
                 start, end,
                 department=filters.get('department'),
@@ -169,19 +602,15 @@ class ReportService:
         else:
             raise ValueError(f"Unknown report type: {report_type}")
 
-        # Generate filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{report_type}_report_{timestamp}"
-
-        # Export format
-        export_format = filters.get('format', 'csv')
-
         if export_format == 'csv':
             filepath = self.export_to_csv(df, f"{filename}.csv")
             download_url = f"/downloads/reports/{filename}.csv"
         elif export_format == 'excel':
             filepath = self.export_to_excel(df, f"{filename}.xlsx")
             download_url = f"/downloads/reports/{filename}.xlsx"
+        elif export_format == 'parquet':
+            filepath = self.export_to_parquet(df, f"{filename}.parquet")
+            download_url = f"/downloads/reports/{filename}.parquet"
         else:
             raise ValueError(f"Unsupported export format: {export_format}")
 
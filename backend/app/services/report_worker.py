@@ -0,0 +1,176 @@
+"""
+Background report generation.
+
+The reports table is the job queue: POST /api/admin/reports/generate only
+inserts a PENDING row and wakes this worker. Every process runs at most
+REPORT_WORKER_THREADS report threads, so report generation cannot take
+over the request workers. Each thread claims jobs one at a time with a
+conditional UPDATE (status PENDING -> RUNNING), so two processes never
+run the same report. It keeps claiming jobs until none are left. Jobs
+waiting beyond the thread limit stay PENDING until a thread frees up.
+
+A job left RUNNING for more than REPORT_JOB_TIMEOUT seconds (its process
+died) can be claimed again. Jobs that were queued when the server
+stopped are picked up on the next wakeup, i.e. the next report request
+or status poll.
+
+Completed reports are reused for identical requests over unchanged data
+(see ReportService.report_cache_key) until their expires_at; when idle the
+worker deletes expired files.
+
+Progress is written through its own connection, so the job's streaming
+query keeps its cursor while pollers see the percentage move. It is
+advisory: a failed progress write is logged and the job carries on.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import db
+from app.models.report import Report, ReportStatus
+from app.services.report_service import ReportService
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ReportWorker:
+    """Bounded thread pool draining the reports job table"""
+
+    def __init__(self, threads: int, job_timeout: float):
+        self.threads = threads
+        self.job_timeout = job_timeout
+        self.report_service = ReportService()
+        self._active = 0
+        self._wakeups = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def notify(self, app):
+        """Make sure a thread will look for queued reports (call after COMMIT)"""
+        with self._lock:
+            self._wakeups += 1
+            if self._active >= self.threads:
+                # A running thread will see the job before it exits
+                return
+            self._active += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(self.threads, 1),
+                                                    thread_name_prefix='report-worker')
+        self._executor.submit(self._drain, app)
+
+    def _drain(self, app):
+        with app.app_context():
+            try:
+                if not self._drain_queue():
+                    return
+                # Idle and no longer counted in _active: drop report files past
+                # their expires_at
+                try:
+                    self.report_service.evict_expired_reports()
+                except Exception:
+                    logger.exception('Report file eviction failed')
+            finally:
+                db.session.remove()
+
+    def _drain_queue(self) -> bool:
+        """Run jobs until none is left; False if the thread stopped on an error"""
+        try:
+            while True:
+                with self._lock:
+                    wakeups = self._wakeups
+                report_id = self._claim_next()
+                if report_id is None:
+                    with self._lock:
+                        # Exit only if nothing was queued since the claim attempt
+                        if self._wakeups == wakeups:
+                            self._active -= 1
+                            return True
+                    continue
+                self._run(report_id)
+        except Exception:
+            logger.exception('Report worker stopped')
+            with self._lock:
+                self._active -= 1
+            return False
+
+    def _claimable(self, now: datetime):
+        stale_before = now - timedelta(seconds=self.job_timeout)
+        return db.or_(
+            Report.status == ReportStatus.PENDING,
+            db.and_(Report.status == ReportStatus.RUNNING, Report.started_at < stale_before)
+        )
+
+    def _claim_next(self):
+        """Atomically move the oldest claimable report to RUNNING"""
+        now = datetime.utcnow()
+        candidates = db.session.query(Report.id).filter(self._claimable(now)).order_by(
+            Report.created_at
+        ).limit(self.threads + 1).all()
+
+        for (report_id,) in candidates:
+            claimed = db.session.execute(
+                db.update(Report).where(Report.id == report_id, self._claimable(now)).values(
+                    status=ReportStatus.RUNNING, started_at=now, progress=0, error_message=None
+                )
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return report_id
+        return None
+
+    def _progress_writer(self, report_id: str):
+        """Progress callback writing only when the percentage changes"""
+        last = [0]
+
+        def set_progress(percent: int):
+            if percent == last[0]:
+                return
+            last[0] = percent
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        db.update(Report.__table__).where(Report.__table__.c.id == report_id).values(progress=percent)
+                    )
+            except Exception as e:
+                # Progress is advisory; the report itself is unaffected
+                logger.warning(f'Could not update progress of report {report_id}: {e}')
+        return set_progress
+
+    def _run(self, report_id: str):
+        report = db.session.get(Report, report_id)
+        filters = dict(report.filters or {})
+        start_date = filters.pop('start_date', None)
+        end_date = filters.pop('end_date', None)
+
+        try:
+            result = self.report_service.generate_report(
+                report.report_type, start_date, end_date, filters,
+                progress=self._progress_writer(report_id),
+                filename=f"{report.report_type}_report_{report_id}"
+            )
+        except Exception as e:
+            logger.exception(f'Report {report_id} failed')
+            db.session.rollback()
+            report = db.session.get(Report, report_id)
+            report.status = ReportStatus.FAILED
+            report.error_message = str(e)
+            db.session.commit()
+            return
+
+        report = db.session.get(Report, report_id)
+        report.status = ReportStatus.COMPLETED
+        report.progress = 100
+        report.file_path = result['filepath']
+        report.file_size = os.path.getsize(result['filepath'])
+        report.record_count = result['record_count']
+        report.generated_at = datetime.utcnow()
+        report.expires_at = report.generated_at + timedelta(hours=Config.REPORT_CACHE_TTL_HOURS)
+        db.session.commit()
+
+
+report_worker = ReportWorker(
+    threads=Config.REPORT_WORKER_THREADS,
+    job_timeout=Config.REPORT_JOB_TIMEOUT
+)
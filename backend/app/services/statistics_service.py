@@ -0,0 +1,75 @@
+from app import db
+from app.models.attendance import AttendanceRecord, AttendanceStatus
+from app.models.attendance_rollup import AttendanceDailyRollup
+from app.models.department import Department
+from app.models.face_encoding import FaceEncoding
+from app.models.user import User
+from datetime import date
+from typing import Dict
+
+
+def _count(model, *conditions):
+    """SELECT COUNT(*) FROM model WHERE ... as a scalar subquery"""
+    return db.select(db.func.count()).select_from(model).where(*conditions).scalar_subquery()
+
+
+class StatisticsService:
+    """Aggregate counters for the admin dashboards, in as few statements as possible"""
+
+    def get_admin_dashboard(self, today: date, week_start: date, week_end: date) -> Dict:
+        """
+        Admin dashboard figures in two statements
+
+        The totals are scalar subqueries of one SELECT; today's present count
+        is read from the weekly trend, so week_start..week_end must contain
+        today.
+
+        Returns:
+            Dict with total_users, total_departments, today_present,
+            today_absent and weekly_trend ({'YYYY-MM-DD': present})
+        """
+        totals = db.session.execute(db.select(
+            _count(User, User.status == 'Active').label('total_users'),
+            _count(Department, Department.status == 'Active').label('total_departments')
+        )).one()
+
+        rollup = AttendanceDailyRollup
+        weekly_stats = db.session.query(
+            rollup.date_only,
+            db.func.sum(db.case(
+                (rollup.status == AttendanceStatus.PRESENT, rollup.count), else_=0
+            )).label('present')
+        ).filter(
+            rollup.date_only.between(week_start, week_end)
+        ).group_by(rollup.date_only).having(db.func.sum(rollup.count) > 0).all()
+
+        weekly_trend = {str(stat.date_only): int(stat.present) for stat in weekly_stats}
+        today_present = weekly_trend.get(str(today), 0)
+
+        return {
+            'total_users': totals.total_users,
+            'total_departments': totals.total_departments,
+            'today_present': today_present,
+            'today_absent': totals.total_users - today_present,
+            'weekly_trend': weekly_trend
+        }
+
+    def get_system_stats(self, today: date = None) -> Dict:
+        """
+        System-wide counters in one statement of scalar subqueries
+
+        Returns:
+            Dict with total/active users, departments, total/verified face
+            encodings, total attendance records and today's attendance
+        """
+        today = today or date.today()
+        row = db.session.execute(db.select(
+            _count(User).label('total_users'),
+            _count(User, User.status == 'Active').label('active_users'),
+            _count(Department).label('total_departments'),
+            _count(FaceEncoding).label('total_face_encodings'),
+            _count(FaceEncoding, FaceEncoding.status == 'verified').label('verified_face_encodings'),
+            _count(AttendanceRecord).label('total_attendance_records'),
+            _count(AttendanceRecord, AttendanceRecord.date_only == today).label('today_attendance')
+        )).one()
+        return dict(row._mapping)
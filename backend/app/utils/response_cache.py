@@ -0,0 +1,286 @@
+"""
+Short-TTL cache for JSON responses of read-heavy views (statistics, dashboards).
+
+    @statistics_bp.route('/dashboard')
+    @jwt_required()
+    @response_cache.cached()
+    def get_dashboard_stats():
+        ...
+        response_cache.cache_dates(week_start, week_end)
+
+Entries are keyed on the request path, query arguments and the caller's
+role (the access token's role claim; shared roles are checked against the
+database, since a shared entry bypasses the view's permission check). For roles outside shared_roles the key also includes the caller's
+user ID, so an employee never receives another employee's response.
+
+Invalidation is by tag version. A view reports which attendance dates its
+response depends on with cache_dates(); without it the response depends on
+every date. When attendance for a date is written, invalidate_dates_on_commit
+queues the date, and after COMMIT its day, month and 'all' tags are bumped.
+A cached entry is served only while the tags it was stored with still have
+the versions it recorded, and never after its TTL.
+
+The backend is an in-process LRU by default. RESPONSE_CACHE_URL=redis://...
+shares one cache between all workers through any Redis-protocol server.
+That needs the optional redis package.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import wraps
+from typing import Iterable, List
+from flask import current_app, g, make_response, request
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models.user import User, UserRole
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+ALL_DATES_TAG = 'all'
+# Spans longer than this are tagged per month instead of per day
+MAX_DAY_TAGS = 31
+
+
+def date_tags(start_date: date, end_date: date) -> List[str]:
+    """Tags of the attendance dates start_date..end_date"""
+    if (end_date - start_date).days < MAX_DAY_TAGS:
+        return [f'day:{(start_date + timedelta(days=offset)).isoformat()}'
+                for offset in range((end_date - start_date).days + 1)]
+    months, month = [], start_date.replace(day=1)
+    while month <= end_date:
+        months.append(f'month:{month.strftime("%Y-%m")}')
+        month = (month + timedelta(days=32)).replace(day=1)
+    return months
+
+
+class MemoryCacheBackend:
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        # Tag versions are never evicted: a reset version could match an old entry
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def versions(self, tags: List[str]) -> List[int]:
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class RedisCacheBackend:
+    """Cache shared by all workers, stored in a Redis-protocol server"""
+
+    def __init__(self, url: str, prefix: str = 'response-cache:'):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl: float):
+        self._client.set(self._prefix + key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def versions(self, tags: List[str]) -> List[int]:
+        if not tags:
+            return []
+        return [int(version or 0) for version in self._client.mget([self._prefix + 'tag:' + tag for tag in tags])]
+
+    def bump(self, tags: Iterable[str]):
+        pipeline = self._client.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(self._prefix + 'tag:' + tag)
+        pipeline.execute()
+
+    def clear(self):
+        keys = [key for key in self._client.scan_iter(match=self._prefix + '*')
+                if not key.decode().startswith(self._prefix + 'tag:')]
+        if keys:
+            self._client.delete(*keys)
+
+
+def create_backend(url: str, max_size: int):
+    """Redis backend for a redis:// URL, otherwise (or if unavailable) the in-process LRU"""
+    if url:
+        try:
+            return RedisCacheBackend(url)
+        except ImportError:
+            logger.warning('RESPONSE_CACHE_URL is set but the redis package is not installed; '
+                           'using the in-process response cache')
+    return MemoryCacheBackend(max_size)
+
+
+class ResponseCache:
+    """Response cache with hit/miss counters"""
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> dict:
+        return {
+            'backend': type(self.backend).__name__,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def _key(self, shared_roles) -> str:
+        # The role comes from the token's claims, so a per-user hit needs no
+        # query. Tokens without the claim get per-user entries.
+        user_id = get_jwt_identity()
+        role = get_jwt().get('role') if user_id else None
+        if role in shared_roles:
+            # A shared entry is served without running the view's own role
+            # check, so a stale claim (a demoted admin's token) must not
+            # select it: shared roles are confirmed against the database
+            user = db.session.get(User, user_id)
+            role = user.role.name if user else None
+        parts = [
+            request.path,
+            sorted(request.args.items(multi=True)),
+            role,
+            None if role in shared_roles else user_id
+        ]
+        return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+    def cache_dates(self, start_date: date, end_date: date = None):
+        """
+        Declare the attendance dates the current view's response depends on
+
+        Call it before running the queries: the tag versions are read here,
+        so a write committed while the view runs invalidates the entry.
+        """
+        if 'response_cache_tags' not in g:
+            return
+        tags = date_tags(start_date, end_date or start_date)
+        g.response_cache_tags = tags
+        g.response_cache_versions = self.backend.versions(tags)
+
+    def cached(self, ttl: float = None, shared_roles=(UserRole.ADMIN.name,)):
+        """
+        Cache successful JSON responses of a view (place below @jwt_required)
+
+        Args:
+            ttl: Seconds an entry may be served (default RESPONSE_CACHE_TTL)
+            shared_roles: Roles whose responses are shared by every user of the role
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                entry_ttl = self.ttl if ttl is None else ttl
+                if entry_ttl <= 0:
+                    return view(*args, **kwargs)
+
+                key = self._key(shared_roles)
+                entry = self.backend.get(key)
+                if entry is not None and self.backend.versions(entry['tags']) == entry['versions']:
+                    self._count(hit=True)
+                    return current_app.response_class(entry['body'], status=entry['status'],
+                                                      mimetype='application/json')
+                self._count(hit=False)
+
+                g.response_cache_tags = [ALL_DATES_TAG]
+                g.response_cache_versions = self.backend.versions(g.response_cache_tags)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and response.is_json:
+                    self.backend.set(key, {
+                        'body': response.get_data(as_text=True),
+                        'status': response.status_code,
+                        'tags': g.response_cache_tags,
+                        'versions': g.response_cache_versions
+                    }, entry_ttl)
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate_dates(self, dates: Iterable[date]):
+        """Expire every entry that depends on any of the dates"""
+        tags = {ALL_DATES_TAG}
+        for day in dates:
+            tags.add(f'day:{day.isoformat()}')
+            tags.add(f'month:{day.strftime("%Y-%m")}')
+        self.backend.bump(sorted(tags))
+
+    def clear(self):
+        self.backend.clear()
+
+
+response_cache = ResponseCache(
+    create_backend(Config.RESPONSE_CACHE_URL, Config.RESPONSE_CACHE_SIZE),
+    ttl=Config.RESPONSE_CACHE_TTL
+)
+
+
+# ---------------------------------------------------------------------------
+# Invalidation: attendance writes expire the dates they touched after COMMIT
+# ---------------------------------------------------------------------------
+
+def invalidate_dates_on_commit(dates: Iterable[date]):
+    """Invalidate cached responses for the dates once the current transaction commits"""
+    db.session.info.setdefault('response_cache_dates', set()).update(dates)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_dates(session):
+    dates = session.info.pop('response_cache_dates', None)
+    if dates:
+        try:
+            response_cache.invalidate_dates(dates)
+        except Exception as e:
+            # The write is committed; stale entries still expire with their TTL
+            logger.warning(f'Response cache invalidation failed: {e}')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('response_cache_dates', None)
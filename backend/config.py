@@ -35,10 +35,76 @@ class Config:
     FACE_RECOGNITION_THRESHOLD = float(os.getenv('FACE_RECOGNITION_THRESHOLD', 0.6))
     MIN_FACE_IMAGES = int(os.getenv('MIN_FACE_IMAGES_FOR_ENROLLMENT', 5))
     MAX_FACE_IMAGES = int(os.getenv('MAX_FACE_IMAGES_FOR_ENROLLMENT', 7))
+    # Image preprocessing: uploads are decoded at most FACE_ENCODE_MAX_SIDE pixels on the
+    # longest side and faces are detected on a FACE_DETECT_MAX_SIDE copy (0 disables either)
+    FACE_ENCODE_MAX_SIDE = int(os.getenv('FACE_ENCODE_MAX_SIDE', 1600))
+    FACE_DETECT_MAX_SIDE = int(os.getenv('FACE_DETECT_MAX_SIDE', 640))
+    FACE_DETECT_UPSAMPLE = int(os.getenv('FACE_DETECT_UPSAMPLE', 1))
+    # 'lazy': dlib models load on the first face request in each process, so workers that
+    # never serve /api/face stay small; 'eager': load them in create_app, which with
+    # gunicorn preload_app (see gunicorn.conf.py) happens once in the master before fork
+    FACE_MODELS_PRELOAD = os.getenv('FACE_MODELS_PRELOAD', 'lazy')
+    # Face worker processes (0 = run inline), extra queued jobs before answering 503,
+    # per-job timeout and the Retry-After hint (seconds)
+    FACE_WORKER_PROCESSES = int(os.getenv('FACE_WORKER_PROCESSES', 2))
+    FACE_WORKER_QUEUE_SIZE = int(os.getenv('FACE_WORKER_QUEUE_SIZE', 8))
+    FACE_WORKER_TIMEOUT = float(os.getenv('FACE_WORKER_TIMEOUT', 15))
+    FACE_WORKER_RETRY_AFTER = int(os.getenv('FACE_WORKER_RETRY_AFTER', 2))
+    # Recent recognition results kept per process, keyed by the SHA-256 of the uploaded
+    # bytes, so retried identical frames skip decoding, detection and encoding (0 disables)
+    FACE_RESULT_CACHE_SIZE = int(os.getenv('FACE_RESULT_CACHE_SIZE', 256))
+    # Maximum number of images accepted by /api/face/recognize/batch, at most
+    # max(FACE_WORKER_PROCESSES, 1) + FACE_WORKER_QUEUE_SIZE (capped at startup)
+    FACE_BATCH_MAX_IMAGES = int(os.getenv('FACE_BATCH_MAX_IMAGES', 10))
+    # Storage dtype for new FaceEncoding.encoding_vector blobs (float64, float32 or float16);
+    # see app/services/face_encoding_format.py and `flask face convert-encodings`
+    FACE_ENCODING_STORAGE_DTYPE = os.getenv('FACE_ENCODING_STORAGE_DTYPE', 'float32')
+    # dtype of the in-memory recognition gallery matrix (float64 or float32)
+    FACE_GALLERY_DTYPE = os.getenv('FACE_GALLERY_DTYPE', 'float32')
+    # How often (seconds) each worker checks the shared gallery version counter
+    FACE_GALLERY_VERSION_CHECK_SECONDS = float(os.getenv('FACE_GALLERY_VERSION_CHECK_SECONDS', 1.0))
+    # Gallery search index: 'exact' (brute force), 'ivf' (approximate) or 'centroid'
+    # (per-user centroid prefilter); shortlists are always re-ranked exactly.
+    # FACE_IVF_NPROBE / FACE_CENTROID_TOP_K trade recall for latency.
+    FACE_INDEX_BACKEND = os.getenv('FACE_INDEX_BACKEND', 'exact')
+    FACE_INDEX_OPTIONS = {
+        'ivf': {
+            'nlist': int(os.getenv('FACE_IVF_NLIST', 256)),
+            'nprobe': int(os.getenv('FACE_IVF_NPROBE', 8)),
+        },
+        'centroid': {
+            'top_k': int(os.getenv('FACE_CENTROID_TOP_K', 10)),
+        },
+    }
+
+    # Attendance
+    # User IDs handled per lookup/INSERT/UPDATE/DELETE statement by bulk attendance operations
+    ATTENDANCE_BULK_CHUNK_SIZE = int(os.getenv('ATTENDANCE_BULK_CHUNK_SIZE', 1000))
+
+    # Response cache for statistics/dashboard endpoints (TTL 0 disables);
+    # RESPONSE_CACHE_URL=redis://... shares it between workers (needs redis)
+    RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 30))
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 512))
+    RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL', '')
+
+    # Reports
+    # Rows fetched (yield_per) and written per chunk by streaming report exports
+    REPORT_EXPORT_CHUNK_SIZE = int(os.getenv('REPORT_EXPORT_CHUNK_SIZE', 5000))
+    # Background report threads per process, and seconds after which a RUNNING
+    # job (e.g. from a crashed process) may be claimed again
+    REPORT_WORKER_THREADS = int(os.getenv('REPORT_WORKER_THREADS', 2))
+    REPORT_JOB_TIMEOUT = int(os.getenv('REPORT_JOB_TIMEOUT', 3600))
+    # Hours a generated report is reused for identical requests before its file is deleted
+    REPORT_CACHE_TTL_HOURS = float(os.getenv('REPORT_CACHE_TTL_HOURS', 24))
 
     # File Upload
     MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE_MB', 5)) * 1024 * 1024
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', '/storage')
+    # Memory-mapped face gallery snapshot shared by all workers (empty disables)
+    FACE_GALLERY_SNAPSHOT_DIR = os.getenv('FACE_GALLERY_SNAPSHOT_DIR', os.path.join(UPLOAD_FOLDER, 'face_gallery'))
+    # Seconds after an enrollment change before the snapshot is republished in the
+    # background; changes within the window share one write
+    FACE_GALLERY_SNAPSHOT_DELAY = float(os.getenv('FACE_GALLERY_SNAPSHOT_DELAY', 5.0))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -0,0 +1,26 @@
+"""
+Gunicorn settings: gunicorn -c gunicorn.conf.py run:app
+
+FACE_MODELS_PRELOAD=eager preloads the app in the master, so the dlib face
+models are loaded once before workers fork and shared copy-on-write. With
+the default (lazy) each worker imports them on its first face request and
+workers that only serve auth/statistics/admin never load them.
+
+Note that with FACE_WORKER_PROCESSES > 0 detection runs in a separate
+spawned pool per worker, which loads its own models; eager preloading then
+mainly helps inline (FACE_WORKER_PROCESSES=0) deployments.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+preload_app = os.getenv('FACE_MODELS_PRELOAD', 'lazy') == 'eager'
+
+
+def post_fork(server, worker):
+    # Never share database connections opened in the master with workers
+    if preload_app:
+        from run import app
+        from app import db
+        with app.app_context():
+            db.engine.dispose()
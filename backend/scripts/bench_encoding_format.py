@@ -0,0 +1,96 @@
+"""
+Regression benchmark for compact face encoding storage.
+
+Stores a synthetic gallery (see bench_face_index.make_gallery) in every
+storage format, decodes it the way FaceGallery.load does and compares
+matching against the float64 baseline: top-1 agreement, accept/reject
+flips at the recognition threshold, worst distance error, storage size,
+decode time and matching latency.
+
+    python scripts/bench_encoding_format.py --users 20000 --probes 500
+    python scripts/bench_encoding_format.py --gallery-dtype float64
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Ensure backend package is importable when running this script directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from bench_face_index import make_gallery
+from app.services.face_encoding_format import decode_encodings, encode_encoding
+from app.services.face_index import squared_distances
+
+
+def match(encodings, probes, batch):
+    """Best gallery row and distance per probe, plus per-call latencies (ms)"""
+    latencies, rows, distances = [], [], []
+    for start in range(0, probes.shape[0], batch):
+        chunk = probes[start:start + batch]
+        begin = time.perf_counter()
+        chunk_distances = np.sqrt(squared_distances(chunk, encodings))
+        best = np.argmin(chunk_distances, axis=1)
+        latencies.append((time.perf_counter() - begin) * 1000)
+        rows.append(best)
+        distances.append(chunk_distances[np.arange(chunk.shape[0]), best])
+    return np.concatenate(rows), np.concatenate(distances).astype(np.float64), np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--min-images', type=int, default=5)
+    parser.add_argument('--max-images', type=int, default=7)
+    parser.add_argument('--probes', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=1, help='Probes matched per call')
+    parser.add_argument('--threshold', type=float, default=0.6)
+    parser.add_argument('--gallery-dtype', default='float32', help='In-memory matrix dtype for compact formats')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    identities, user_ids, encodings = make_gallery(args.users, args.min_images, args.max_images, rng)
+    probe_users = rng.integers(0, args.users, size=args.probes)
+    # Half the probes are enrolled users, half are strangers
+    probes = identities[probe_users] + rng.normal(scale=0.02, size=(args.probes, 128))
+    strangers = rng.random(args.probes) < 0.5
+    probes[strangers] = rng.normal(scale=0.09, size=(int(strangers.sum()), 128))
+
+    print(f"gallery: {encodings.shape[0]} encodings, {args.users} users, {args.probes} probes "
+          f"(batch {args.batch}), threshold {args.threshold}")
+
+    formats = [('legacy float64', None, 'float64'),
+               ('v1 float64', 'float64', 'float64'),
+               ('v1 float32', 'float32', args.gallery_dtype),
+               ('v1 float16', 'float16', args.gallery_dtype)]
+
+    baseline = None
+    print(f"{'format':<16}{'bytes/enc':>10}{'matrix MB':>10}{'decode s':>10}{'top1 agree':>12}"
+          f"{'flips':>7}{'max |dd|':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, storage_dtype, gallery_dtype in formats:
+        if storage_dtype is None:
+            blobs = [vector.tobytes() for vector in encodings]
+        else:
+            blobs = [encode_encoding(vector, storage_dtype) for vector in encodings]
+
+        start = time.perf_counter()
+        gallery = decode_encodings(blobs).astype(gallery_dtype, copy=False)
+        decode_seconds = time.perf_counter() - start
+
+        rows, distances, latencies = match(gallery, probes.astype(gallery_dtype), args.batch)
+        if baseline is None:
+            baseline = rows, distances
+        agreement = np.mean(rows == baseline[0])
+        flips = int(np.sum((distances <= args.threshold) != (baseline[1] <= args.threshold)))
+        max_error = np.max(np.abs(distances - baseline[1]))
+
+        print(f"{name:<16}{len(blobs[0]):>10}{gallery.nbytes / 2**20:>10.1f}{decode_seconds:>10.3f}"
+              f"{agreement:>12.4f}{flips:>7}{max_error:>10.2e}"
+              f"{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 99):>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark gallery search backends against exhaustive search.
+
+Builds a synthetic gallery shaped like real enrollments (each user has
+MIN..MAX_FACE_IMAGES encodings scattered around a per-user identity) and
+reports recall@1 and latency percentiles for every backend.
+
+    python scripts/bench_face_index.py --users 50000 --probes 500
+    python scripts/bench_face_index.py --nlist 512 --nprobe 16 --top-k 5 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Ensure backend package is importable when running this script directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from app.services.face_index import create_index
+
+
+def make_gallery(users: int, min_images: int, max_images: int, rng):
+    identities = rng.normal(scale=0.09, size=(users, 128))
+    counts = rng.integers(min_images, max_images + 1, size=users)
+    user_ids = np.repeat(np.arange(users), counts)
+    encodings = identities[user_ids] + rng.normal(scale=0.02, size=(user_ids.size, 128))
+    return identities, user_ids, encodings
+
+
+def search(index, encodings, probe):
+    rows = index.candidates(probe, encodings)
+    if rows is None or rows.size == 0:
+        return int(np.argmin(np.linalg.norm(encodings - probe, axis=1)))
+    return int(rows[np.argmin(np.linalg.norm(encodings[rows] - probe, axis=1))])
+
+
+def run(name, index, encodings, user_ids, probes):
+    build_start = time.perf_counter()
+    index.build(encodings, user_ids)
+    build_seconds = time.perf_counter() - build_start
+
+    results, latencies = [], []
+    for probe in probes:
+        start = time.perf_counter()
+        results.append(search(index, encodings, probe))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return name, np.array(results), np.array(latencies), build_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--min-images', type=int, default=5)
+    parser.add_argument('--max-images', type=int, default=7)
+    parser.add_argument('--probes', type=int, default=300)
+    parser.add_argument('--dtype', default='float64')
+    parser.add_argument('--nlist', type=int, default=256)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--top-k', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    identities, user_ids, encodings = make_gallery(args.users, args.min_images, args.max_images, rng)
+    encodings = encodings.astype(args.dtype)
+    probe_users = rng.integers(0, args.users, size=args.probes)
+    probes = (identities[probe_users] + rng.normal(scale=0.02, size=(args.probes, 128))).astype(args.dtype)
+
+    print(f"gallery: {encodings.shape[0]} encodings, {args.users} users, {args.probes} probes")
+
+    runs = [run('exact', create_index('exact'), encodings, user_ids, probes)]
+    for nprobe in args.nprobe:
+        index = create_index('ivf', nlist=args.nlist, nprobe=nprobe)
+        runs.append(run(f'ivf nlist={args.nlist} nprobe={nprobe}', index, encodings, user_ids, probes))
+    for top_k in args.top_k:
+        index = create_index('centroid', top_k=top_k)
+        runs.append(run(f'centroid top_k={top_k}', index, encodings, user_ids, probes))
+
+    exact_results = runs[0][1]
+    print(f"{'backend':<28}{'recall@1':>10}{'user acc':>10}{'p50 ms':>10}{'p99 ms':>10}{'build s':>10}")
+    for name, results, latencies, build_seconds in runs:
+        recall = np.mean(results == exact_results)
+        user_accuracy = np.mean(user_ids[results] == probe_users)
+        print(f"{name:<28}{recall:>10.4f}{user_accuracy:>10.4f}"
+              f"{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 99):>10.2f}{build_seconds:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
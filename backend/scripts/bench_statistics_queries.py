@@ -0,0 +1,185 @@
+"""
+Benchmark the admin dashboard and system stats queries.
+
+Seeds a database with synthetic users, departments, face encodings and
+attendance, then compares the former per-counter queries of
+/api/statistics/dashboard (admin) and /api/admin/system/stats with
+StatisticsService: statements (round-trips) per call and latency.
+
+    python scripts/bench_statistics_queries.py --users 5000 --days 60
+    python scripts/bench_statistics_queries.py --database-url mysql+mysqlconnector://user:pw@host/bench_db
+
+Runs against in-memory SQLite by default, where a round-trip costs almost
+nothing; over a network each saved statement also saves its latency.
+--database-url drops and recreates every table of that database.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# Ensure backend package is importable when running this script directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from sqlalchemy import and_, case, event, func
+from config import TestingConfig, config
+from app import create_app, db
+from app.models import AttendanceRecord, Department, FaceEncoding, User
+from app.models.attendance import AttendanceSource, AttendanceStatus
+from app.models.face_encoding import FaceEncodingStatus
+from app.models.user import UserRole
+from app.services.attendance_rollup import rebuild_monthly_counters, rebuild_rollup
+from app.services.statistics_service import StatisticsService
+
+
+def legacy_admin_dashboard(today, week_start, week_end):
+    """Admin branch of get_dashboard_stats before StatisticsService"""
+    total_users = User.query.filter_by(status='Active').count()
+    total_departments = Department.query.filter_by(status='Active').count()
+    today_present = AttendanceRecord.query.filter(
+        and_(AttendanceRecord.date_only == today, AttendanceRecord.status == 'Present')
+    ).count()
+    weekly_stats = db.session.query(
+        AttendanceRecord.date_only,
+        func.count(case((AttendanceRecord.status == 'Present', 1))).label('present')
+    ).filter(
+        AttendanceRecord.date_only.between(week_start, week_end)
+    ).group_by(AttendanceRecord.date_only).all()
+    return {
+        'total_users': total_users,
+        'total_departments': total_departments,
+        'today_present': today_present,
+        'today_absent': total_users - today_present,
+        'weekly_trend': {str(stat.date_only): stat.present for stat in weekly_stats}
+    }
+
+
+def legacy_system_stats(today):
+    """get_system_stats before StatisticsService"""
+    return {
+        'total_users': User.query.count(),
+        'active_users': User.query.filter_by(status='Active').count(),
+        'total_departments': Department.query.count(),
+        'total_face_encodings': FaceEncoding.query.count(),
+        'verified_face_encodings': FaceEncoding.query.filter_by(status='verified').count(),
+        'total_attendance_records': AttendanceRecord.query.count(),
+        'today_attendance': AttendanceRecord.query.filter_by(date_only=today).count()
+    }
+
+
+def seed(users, departments, days, rng):
+    today = date.today()
+    now = datetime.utcnow()
+    department_ids = [f'DEPT{index:03d}' for index in range(departments)]
+    db.session.execute(db.insert(Department), [
+        {'id': department_id, 'name': f'Department {department_id}'} for department_id in department_ids
+    ])
+    db.session.execute(db.insert(User), [
+        {
+            'id': f'U{index:06d}',
+            'name': f'User {index}',
+            'email': f'user{index}@example.com',
+            'password_hash': 'x',
+            'role': UserRole.EMPLOYEE,
+            'department': department_ids[index % departments],
+            'join_date': today - timedelta(days=days)
+        }
+        for index in range(users)
+    ])
+    db.session.execute(db.insert(FaceEncoding), [
+        {
+            'id': f'FE{index:06d}',
+            'user_id': f'U{index:06d}',
+            'encoding_vector': b'\0',
+            'image_url': '',
+            'captured_at': now,
+            'status': FaceEncodingStatus.VERIFIED
+        }
+        for index in range(users)
+    ])
+
+    statuses = list(AttendanceStatus)
+    record_id = 0
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        present = rng.random(users) < 0.9
+        rows = []
+        for index in np.flatnonzero(present):
+            record_id += 1
+            rows.append({
+                'id': record_id,
+                'user_id': f'U{index:06d}',
+                'date_only': day,
+                'timestamp': now,
+                'status': statuses[rng.integers(len(statuses))],
+                'source': AttendanceSource.FACE_RECOGNITION
+            })
+        db.session.execute(db.insert(AttendanceRecord), rows)
+
+    rebuild_rollup(today - timedelta(days=days), today)
+    rebuild_monthly_counters(today - timedelta(days=days), today)
+    db.session.commit()
+
+
+def measure(name, function, repeat, counter):
+    counter[0] = 0
+    function()
+    statements = counter[0]
+    latencies = []
+    for _ in range(repeat):
+        db.session.expire_all()
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies = np.array(latencies)
+    print(f"{name:<32}{statements:>12}{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 99):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--departments', type=int, default=20)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--database-url', default=None, help='Benchmark database (default in-memory SQLite)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config['bench'] = type('BenchConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': args.database_url or TestingConfig.SQLALCHEMY_DATABASE_URI
+    })
+    app = create_app('bench')
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.users, args.departments, args.days, np.random.default_rng(args.seed))
+
+        counter = [0]
+        event.listen(db.engine, 'before_cursor_execute', lambda *_: counter.__setitem__(0, counter[0] + 1))
+
+        service = StatisticsService()
+        today = date.today()
+        week_start = today - timedelta(days=today.weekday())
+        week_end = week_start + timedelta(days=6)
+
+        print(f"{args.users} users, {args.departments} departments, {args.days} days of attendance, "
+              f"{args.repeat} runs")
+        print(f"{'query':<32}{'statements':>12}{'p50 ms':>10}{'p99 ms':>10}")
+        measure('admin dashboard (before)', lambda: legacy_admin_dashboard(today, week_start, week_end),
+                args.repeat, counter)
+        measure('admin dashboard (service)', lambda: service.get_admin_dashboard(today, week_start, week_end),
+                args.repeat, counter)
+        measure('system stats (before)', lambda: legacy_system_stats(today), args.repeat, counter)
+        measure('system stats (service)', lambda: service.get_system_stats(today), args.repeat, counter)
+
+        before = legacy_system_stats(today)
+        after = service.get_system_stats(today)
+        print(f"system stats identical: {before == after}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import os
+from datetime import date
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+# Tests never start the face worker pool
+os.environ.setdefault('FACE_WORKER_PROCESSES', '0')
+
+from config import TestingConfig, config
+from app import create_app, db
+from app.models.attendance import AttendanceRecord, AttendanceSource, AttendanceStatus
+from app.models.department import Department
+from app.models.user import User, UserRole
+from app.services.auth_service import AuthService
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    Application on a file-backed SQLite database
+
+    Unlike sqlite:///:memory: every pooled connection sees the same data,
+    so a test can commit through a second connection to play a concurrent
+    request.
+    """
+    config['tests'] = type('TestsConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"
+    })
+    app = create_app('tests')
+    with app.app_context():
+        # WAL lets a writer commit while another connection holds a read
+        # open, as MySQL's InnoDB does (e.g. report progress during an export)
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA journal_mode=WAL')
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_users(app):
+    """Create active employees U0..U{count-1} in department D1"""
+    def make_users(count, department='D1'):
+        if db.session.get(Department, department) is None:
+            db.session.add(Department(id=department, name=f'Department {department}'))
+        users = [
+            User(id=f'U{index}', name=f'User {index}', email=f'u{index}@example.com', password_hash='x',
+                 role=UserRole.EMPLOYEE, department=department, join_date=date(2024, 1, 1))
+            for index in range(count)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+    return make_users
+
+
+@pytest.fixture
+def auth_headers(app):
+    """Authorization header for a stored access token, with the claims login issues"""
+    def auth_headers(user_id):
+        user = db.session.get(User, user_id)
+        token = create_access_token(identity=user_id, additional_claims={
+            'role': user.role.name,
+            'name': user.name
+        })
+        AuthService().store_token(token, user_id)
+        return {'Authorization': f'Bearer {token}'}
+    return auth_headers
+
+
+@pytest.fixture
+def concurrent_checkin(app):
+    """
+    Commit a check-in from another connection just before the next
+    statement starting with `before` (default the next INSERT into
+    attendance_records, i.e. after the caller's existence check)
+    """
+    pending = []
+
+    def checkin(conn, cursor, statement, parameters, context, executemany):
+        if not pending or not statement.startswith(pending[-1][2]):
+            return
+        user_id, attendance_date, _ = pending.pop()
+        with db.engine.connect() as other:
+            other.execute(db.insert(AttendanceRecord.__table__).values(
+                user_id=user_id, date_only=attendance_date, status=AttendanceStatus.PRESENT,
+                source=AttendanceSource.API
+            ))
+            other.commit()
+
+    event.listen(db.engine, 'before_cursor_execute', checkin)
+    def arm(user_id, attendance_date, before='INSERT INTO attendance_records'):
+        pending.append((user_id, attendance_date, before))
+
+    yield arm
+    event.remove(db.engine, 'before_cursor_execute', checkin)
@@ -0,0 +1,47 @@
+from datetime import date
+
+from app import db
+from app.models.attendance import AttendanceRecord
+from app.services.attendance_service import AttendanceService
+
+
+def _matches(user_ids):
+    return [{'user_id': user_id, 'face_encoding_id': None, 'confidence': 0.9, 'distance': 0.3}
+            for user_id in user_ids]
+
+
+def test_batch_marks_each_user_once(make_users):
+    user_ids = make_users(3)
+    matches = _matches(user_ids) + [{'user_id': 'U0', 'confidence': 0.95, 'distance': 0.1}]
+
+    results, status_code = AttendanceService().mark_attendance_batch(matches)
+
+    assert status_code == 200, results
+    assert {user_id: result['status'] for user_id, result in results.items()} == dict.fromkeys(user_ids, 'marked')
+    assert results['U0']['record']['confidence'] == 0.95
+    assert all(result['record']['id'] for result in results.values())
+    assert AttendanceRecord.query.count() == 3
+
+
+def test_batch_reports_existing_records(make_users):
+    user_ids = make_users(2)
+    AttendanceService().mark_attendance('U1')
+
+    results, _ = AttendanceService().mark_attendance_batch(_matches(user_ids))
+
+    assert results['U0']['status'] == 'marked'
+    assert results['U1']['status'] == 'already_marked'
+
+
+def test_batch_survives_concurrent_checkin(make_users, concurrent_checkin):
+    user_ids = make_users(3)
+    concurrent_checkin('U1', date.today())
+
+    results, status_code = AttendanceService().mark_attendance_batch(_matches(user_ids))
+
+    assert status_code == 200, results
+    assert results['U0']['status'] == 'marked'
+    assert results['U1']['status'] == 'already_marked'
+    assert results['U2']['status'] == 'marked'
+    assert db.session.query(AttendanceRecord.user_id).order_by(AttendanceRecord.user_id).all() == \
+        [('U0',), ('U1',), ('U2',)]
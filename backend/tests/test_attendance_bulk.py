@@ -0,0 +1,47 @@
+from datetime import date
+
+from app import db
+from app.models.attendance import AttendanceRecord, AttendanceStatus
+from app.services.attendance_service import AttendanceService
+
+DAY = date(2024, 3, 4)
+
+
+def _statuses(outcomes):
+    return {outcome['user_id']: outcome['status'] for outcome in outcomes}
+
+
+def test_bulk_mark_reports_each_user(make_users, monkeypatch):
+    monkeypatch.setattr('config.Config.ATTENDANCE_BULK_CHUNK_SIZE', 2)
+    make_users(3)
+    AttendanceService().apply_bulk('mark', ['U1'], DAY)
+
+    outcomes = AttendanceService().apply_bulk('mark', ['U0', 'U1', 'U2', 'U0', 'NOPE'], DAY,
+                                              include_records=True)
+
+    assert _statuses(outcomes) == {'U0': 'marked', 'U1': 'already_marked', 'U2': 'marked', 'NOPE': 'failed'}
+    assert outcomes[0]['record_id'] and outcomes[1]['record']['user_id'] == 'U1'
+    assert AttendanceRecord.query.count() == 3
+
+
+def test_bulk_mark_survives_concurrent_checkin(make_users, concurrent_checkin):
+    make_users(4)
+    concurrent_checkin('U2', DAY)
+
+    outcomes = AttendanceService().apply_bulk('mark', ['U0', 'U1', 'U2', 'U3'], DAY)
+
+    assert _statuses(outcomes) == {'U0': 'marked', 'U1': 'marked', 'U2': 'already_marked', 'U3': 'marked'}
+    assert AttendanceRecord.query.filter_by(date_only=DAY).count() == 4
+
+
+def test_bulk_update_and_delete(make_users):
+    make_users(2)
+    service = AttendanceService()
+    service.apply_bulk('mark', ['U0'], DAY)
+
+    assert _statuses(service.apply_bulk('update', ['U0', 'U1'], DAY, status='Late')) == \
+        {'U0': 'updated', 'U1': 'not_found'}
+    assert db.session.query(AttendanceRecord.status).scalar() == AttendanceStatus.LATE
+
+    assert _statuses(service.apply_bulk('delete', ['U0'], DAY)) == {'U0': 'deleted'}
+    assert AttendanceRecord.query.count() == 0
@@ -0,0 +1,109 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from app import db
+from app.models.attendance import AttendanceRecord, AttendanceStatus
+from app.models.attendance_rollup import AttendanceDailyRollup, AttendanceMonthlyCounter
+from app.models.user import User
+from app.services.attendance_service import AttendanceService
+
+DAY = date(2024, 3, 4)
+
+
+def _rollup():
+    return {
+        (row.date_only, row.department, row.status): row.count
+        for row in AttendanceDailyRollup.query.all() if row.count
+    }
+
+
+def _counters():
+    return {
+        (row.user_id, row.month_start): (row.total_days, row.present_days, row.absent_days,
+                                         row.late_days, row.leave_days)
+        for row in AttendanceMonthlyCounter.query.all() if row.total_days
+    }
+
+
+def _recount():
+    """Rollup and monthly counters recomputed in Python from attendance_records"""
+    rows = db.session.query(AttendanceRecord.user_id, AttendanceRecord.date_only, AttendanceRecord.status,
+                            User.department).join(User).all()
+    rollup = Counter((day, department or '', status) for _, day, status, department in rows)
+    months = {}
+    for user_id, day, status, _ in rows:
+        counts = months.setdefault((user_id, day.replace(day=1)), Counter())
+        counts[status] += 1
+    counters = {
+        key: (sum(counts.values()), counts[AttendanceStatus.PRESENT], counts[AttendanceStatus.ABSENT],
+              counts[AttendanceStatus.LATE], counts[AttendanceStatus.LEAVE])
+        for key, counts in months.items()
+    }
+    return dict(rollup), counters
+
+
+def _assert_consistent():
+    db.session.expire_all()
+    assert (_rollup(), _counters()) == _recount()
+
+
+def test_rollup_follows_every_write_path(make_users):
+    make_users(5)
+    service = AttendanceService()
+
+    service.mark_attendance('U0')
+    service.mark_attendance_batch([{'user_id': user_id, 'confidence': 0.9, 'distance': 0.3}
+                                   for user_id in ('U0', 'U1')])
+    _assert_consistent()
+
+    service.apply_bulk('mark', ['U0', 'U1', 'U2', 'U3'], DAY, status='Late')
+    service.apply_bulk('mark', ['U1'], DAY + timedelta(days=30))
+    _assert_consistent()
+
+    service.apply_bulk('update', ['U1', 'U2'], DAY, status='Present')
+    record = AttendanceRecord.query.filter_by(user_id='U3', date_only=DAY).one()
+    service.update_attendance_record(record.id, 'On Leave')
+    _assert_consistent()
+
+    service.apply_bulk('delete', ['U0', 'U2'], DAY)
+    _assert_consistent()
+    assert _rollup()[(DAY, 'D1', AttendanceStatus.PRESENT)] == 1
+
+
+def test_materialize_absences_updates_counters_incrementally(make_users):
+    make_users(4)
+    AttendanceService().apply_bulk('mark', ['U1'], DAY)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert AttendanceService().materialize_absences(DAY) == 3
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    _assert_consistent()
+    assert _rollup()[(DAY, 'D1', AttendanceStatus.ABSENT)] == 3
+    # No month-wide recount, and no per-user statements or parameters
+    assert not [statement for statement in statements if statement.startswith('DELETE')]
+    assert [statement.split(' (')[0] for statement in statements if statement.startswith('INSERT')] == [
+        'INSERT INTO attendance_daily_rollup', 'INSERT INTO attendance_monthly_counters',
+        'INSERT INTO attendance_records'
+    ]
+
+    assert AttendanceService().materialize_absences(DAY) == 0
+    _assert_consistent()
+
+
+def test_materialize_absences_survives_concurrent_checkin(make_users, concurrent_checkin):
+    make_users(3)
+    # After the absent users were counted, before the rollup upserts
+    concurrent_checkin('U1', DAY, before='INSERT INTO attendance_daily_rollup')
+
+    assert AttendanceService().materialize_absences(DAY) == 2
+    assert {record.user_id: record.status for record in AttendanceRecord.query.all()} == {
+        'U0': AttendanceStatus.ABSENT, 'U1': AttendanceStatus.PRESENT, 'U2': AttendanceStatus.ABSENT
+    }
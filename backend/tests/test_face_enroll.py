@@ -0,0 +1,73 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.models.face_encoding import FaceEncoding
+
+
+def _png(width, height):
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)).save(
+        buffer, format='PNG'
+    )
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def enroll(app, make_users, auth_headers, tmp_path, monkeypatch):
+    monkeypatch.setattr('config.Config.UPLOAD_FOLDER', str(tmp_path / 'storage'))
+    monkeypatch.setitem(app.config, 'FACE_RECOGNITION_AVAILABLE', True)
+    make_users(2)
+    # The face models are not needed here: analysis runs on a downscaled copy anyway
+    monkeypatch.setattr('app.routes.face.face_service.analyze_face', lambda image_bytes, **kwargs: {
+        'face_count': 1, 'encoding': np.zeros(128), 'quality_score': 1.0, 'issues': [],
+        'face_confidence': 0.9, 'timings': {}
+    })
+
+    def enroll(user_id, upload):
+        return app.test_client().post(
+            '/api/face/enroll', headers=auth_headers(user_id),
+            data={'image': (io.BytesIO(upload), 'face.png')}, content_type='multipart/form-data'
+        )
+    return enroll
+
+
+def test_enroll_stores_original_upload(enroll):
+    upload = _png(2400, 1800)
+
+    response = enroll('U0', upload)
+
+    assert response.status_code == 201, response.get_json()
+    image_path = FaceEncoding.query.one().image_url
+    assert os.path.splitext(image_path)[1] == '.png'
+    with open(image_path, 'rb') as image_file:
+        assert image_file.read() == upload
+
+
+def test_duplicate_upload_checked_per_user(enroll):
+    upload = _png(200, 200)
+    assert enroll('U0', upload).status_code == 201
+
+    again = enroll('U0', upload)
+    assert again.status_code == 409
+    assert again.get_json()['face_encoding_id'] == FaceEncoding.query.filter_by(user_id='U0').one().id
+
+    # Another user's identical image neither leaks the first record nor blocks enrollment
+    other = enroll('U1', upload)
+    assert other.status_code == 201
+    assert FaceEncoding.query.filter_by(user_id='U1').count() == 1
+
+
+def test_face_model_endpoints_unavailable_without_face_recognition(enroll, app, auth_headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'FACE_RECOGNITION_AVAILABLE', False)
+
+    response = enroll('U0', _png(200, 200))
+    assert response.status_code == 503
+    assert 'not available' in response.get_json()['error']
+
+    # Stored encodings stay readable
+    status = app.test_client().get('/api/face/user/U0/encodings', headers=auth_headers('U0'))
+    assert status.status_code == 200
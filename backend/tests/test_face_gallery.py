@@ -0,0 +1,133 @@
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models.face_encoding import FaceEncoding, FaceEncodingStatus
+from app.models.system_config import SystemConfig
+from app.services.face_encoding_format import encode_encoding
+from app.services.face_gallery import GALLERY_VERSION_KEY, bump_gallery_version, face_gallery, read_gallery_version
+from app.services.face_gallery_snapshot import read_snapshot_version, write_snapshot
+
+
+@pytest.fixture
+def gallery(app, make_users, monkeypatch):
+    monkeypatch.setattr(face_gallery, 'snapshot_dir', None)
+    make_users(2)
+    face_gallery.invalidate()
+    face_gallery.ensure_loaded()
+    yield face_gallery
+    face_gallery.invalidate()
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).random(128)
+
+
+def _encoding(encoding_id, user_id, seed, status=FaceEncodingStatus.VERIFIED):
+    return FaceEncoding(id=encoding_id, user_id=user_id, encoding_vector=encode_encoding(_vector(seed)),
+                        image_url='', captured_at=datetime.utcnow(), status=status)
+
+
+def test_committed_changes_reach_gallery(gallery):
+    db.session.add_all([_encoding('E0', 'U0', 0), _encoding('E1', 'U1', 1),
+                        _encoding('E2', 'U1', 2, status=FaceEncodingStatus.PENDING)])
+    db.session.commit()
+
+    assert set(gallery.encoding_ids) == {'E0', 'E1'}
+    assert gallery.version == read_gallery_version()
+    user_id, encoding_id, distance = gallery.best_match(_vector(1))
+    assert (user_id, encoding_id) == ('U1', 'E1') and distance < 1e-5
+
+    # Verification adds, rejection and deletion remove
+    db.session.get(FaceEncoding, 'E2').status = FaceEncodingStatus.VERIFIED
+    db.session.get(FaceEncoding, 'E0').status = FaceEncodingStatus.REJECTED
+    db.session.commit()
+    assert set(gallery.encoding_ids) == {'E1', 'E2'}
+
+    db.session.delete(db.session.get(FaceEncoding, 'E1'))
+    db.session.commit()
+    assert list(gallery.encoding_ids) == ['E2']
+    assert gallery.version == read_gallery_version()
+
+
+def test_rolled_back_changes_do_not_reach_gallery(gallery):
+    db.session.add(_encoding('E0', 'U0', 0))
+    db.session.flush()
+    db.session.rollback()
+
+    assert len(gallery) == 0
+    db.session.commit()
+    assert len(gallery) == 0
+    assert read_gallery_version() == gallery.version
+
+
+def test_change_by_another_process_forces_reload(gallery):
+    # Another worker commits an encoding (and bumps the version) directly
+    with db.engine.begin() as connection:
+        connection.execute(db.insert(FaceEncoding.__table__).values(
+            id='E9', user_id='U1', encoding_vector=encode_encoding(_vector(9)), image_url='',
+            captured_at=datetime.utcnow(), status=FaceEncodingStatus.VERIFIED
+        ))
+        bump_gallery_version(connection)
+
+    db.session.add(_encoding('E0', 'U0', 0))
+    db.session.commit()
+
+    # The local copy missed version 1, so it reloads instead of patching
+    assert not gallery.loaded
+    gallery.ensure_loaded()
+    assert set(gallery.encoding_ids) == {'E0', 'E9'}
+
+
+def test_snapshot_published_in_background(gallery, tmp_path, monkeypatch):
+    monkeypatch.setattr(gallery, 'snapshot_dir', str(tmp_path / 'snapshot'))
+    monkeypatch.setattr(gallery, 'snapshot_delay', 0.2)
+    writes = []
+    monkeypatch.setattr('app.services.face_gallery.write_snapshot',
+                        lambda directory, version, *args: writes.append(version) or
+                        write_snapshot(directory, version, *args))
+
+    db.session.add(_encoding('E0', 'U0', 0))
+    db.session.commit()
+    db.session.add(_encoding('E1', 'U1', 1))
+    db.session.commit()
+    # Not written by the committing request
+    assert writes == []
+
+    deadline = time.monotonic() + 5
+    while not writes and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.3)
+    # Both commits share one write of the latest version
+    assert writes == [gallery.version]
+    assert read_snapshot_version(str(tmp_path / 'snapshot')) == gallery.version
+
+
+def test_snapshot_never_replaced_by_older_version(tmp_path):
+    directory = str(tmp_path)
+    assert write_snapshot(directory, 5, np.zeros((1, 128)), ['U0'], ['E0'])
+    assert not write_snapshot(directory, 4, np.zeros((2, 128)), ['U0', 'U1'], ['E0', 'E1'])
+    assert not write_snapshot(directory, 5, np.zeros((2, 128)), ['U0', 'U1'], ['E0', 'E1'])
+    assert read_snapshot_version(directory) == 5
+
+
+def test_first_bump_survives_concurrent_insert(app):
+    table = SystemConfig.__table__
+    with db.engine.begin() as connection:
+        # Another flush creates the row between our UPDATE and INSERT
+        @event.listens_for(connection, 'after_execute')
+        def insert_row(conn, clauseelement, *args):
+            if getattr(clauseelement, 'is_update', False) and not conn.info.get('raced'):
+                conn.info['raced'] = True
+                conn.execute(db.insert(table).values(
+                    config_key=GALLERY_VERSION_KEY, config_value='1', data_type='number'
+                ))
+
+        assert bump_gallery_version(connection) == 2
+
+    with db.engine.connect() as connection:
+        assert read_gallery_version(connection) == 2
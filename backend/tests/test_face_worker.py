@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from app.services.face_worker import FaceWorkerBusy, FaceWorkerPool
+
+
+def _square(value):
+    time.sleep(0.05)
+    return value * value
+
+
+@pytest.fixture
+def pool():
+    pool = FaceWorkerPool(processes=1, queue_size=2, timeout=30, retry_after=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_run_many_handles_batches_larger_than_capacity(pool):
+    assert pool.capacity == 3
+    assert pool.run_many(_square, list(range(8))) == [value * value for value in range(8)]
+
+
+def test_run_many_waits_for_slots_held_by_other_requests(pool):
+    pool._slots.acquire()
+    pool._slots.acquire()
+    try:
+        assert pool.run_many(_square, [1, 2, 3, 4]) == [1, 4, 9, 16]
+    finally:
+        pool._slots.release()
+        pool._slots.release()
+
+
+def test_run_many_busy_without_free_slot(pool):
+    for _ in range(pool.capacity):
+        pool._slots.acquire()
+    try:
+        with pytest.raises(FaceWorkerBusy):
+            pool.run_many(_square, [1])
+    finally:
+        for _ in range(pool.capacity):
+            pool._slots.release()
+
+
+def test_batch_limit_capped_at_pool_capacity(monkeypatch):
+    from app import create_app
+    from app.services.face_worker import face_worker
+
+    monkeypatch.setattr(face_worker, 'processes', 2)
+    monkeypatch.setattr(face_worker, 'capacity', 10)
+    monkeypatch.setattr('config.TestingConfig.FACE_BATCH_MAX_IMAGES', 16)
+
+    assert create_app('testing').config['FACE_BATCH_MAX_IMAGES'] == 10
@@ -0,0 +1,142 @@
+import os
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models.report import Report, ReportStatus
+from app.services.attendance_service import AttendanceService
+from app.services.report_service import ReportService
+from app.services.report_worker import ReportWorker
+
+START = date(2024, 3, 4)
+PERIOD = (START.isoformat(), (START + timedelta(days=4)).isoformat())
+
+
+@pytest.fixture
+def attendance(make_users, tmp_path, monkeypatch):
+    monkeypatch.setattr('config.Config.UPLOAD_FOLDER', str(tmp_path / 'storage'))
+    monkeypatch.setattr('config.Config.REPORT_EXPORT_CHUNK_SIZE', 3)
+    user_ids = make_users(4)
+    for offset in range(5):
+        AttendanceService().apply_bulk('mark', user_ids, START + timedelta(days=offset))
+    return user_ids
+
+
+def _queue(filters=None):
+    return ReportService().create_report_job('U0', 'attendance', *PERIOD, filters=filters)
+
+
+def test_job_is_claimed_once(attendance):
+    report, _ = _queue()
+    first, second = ReportWorker(threads=1, job_timeout=3600), ReportWorker(threads=1, job_timeout=3600)
+
+    assert first._claim_next() == report.id
+    assert second._claim_next() is None
+
+    # A RUNNING job past the timeout belongs to a dead process and is claimable again
+    db.session.get(Report, report.id).started_at = datetime.utcnow() - timedelta(hours=2)
+    db.session.commit()
+    assert second._claim_next() == report.id
+
+
+def test_job_completes(attendance):
+    report, _ = _queue()
+    worker = ReportWorker(threads=1, job_timeout=3600)
+
+    worker._run(worker._claim_next())
+
+    report = db.session.get(Report, report.id)
+    assert report.status == ReportStatus.COMPLETED
+    assert (report.progress, report.record_count) == (100, 20)
+    assert report.file_size > 0 and report.expires_at > report.generated_at
+
+
+def test_progress_failure_does_not_fail_job(attendance):
+    report, _ = _queue()
+    worker = ReportWorker(threads=1, job_timeout=3600)
+
+    def locked(conn, cursor, statement, *args):
+        if statement.startswith('UPDATE reports SET progress'):
+            raise RuntimeError('database is locked')
+    event.listen(db.engine, 'before_cursor_execute', locked)
+    try:
+        worker._run(worker._claim_next())
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', locked)
+
+    assert db.session.get(Report, report.id).status == ReportStatus.COMPLETED
+
+
+def test_progress_written_only_when_it_changes(attendance):
+    report, _ = _queue()
+    updates = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.startswith('UPDATE reports SET progress'):
+            updates.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        set_progress = ReportWorker(threads=1, job_timeout=3600)._progress_writer(report.id)
+        for percent in (10, 10, 10, 40, 40):
+            set_progress(percent)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    assert len(updates) == 2
+    db.session.expire_all()
+    assert db.session.get(Report, report.id).progress == 40
+
+
+def test_identical_request_reuses_report(attendance):
+    report, reused = _queue()
+    assert not reused
+
+    # Queued: the same request joins the existing job
+    assert _queue() == (report, True)
+    # A different format is a different report
+    assert not _queue({'format': 'excel'})[1]
+
+    worker = ReportWorker(threads=1, job_timeout=3600)
+    worker._run(worker._claim_next())
+    assert _queue() == (db.session.get(Report, report.id), True)
+
+
+def test_attendance_change_invalidates_cached_report(attendance):
+    report, _ = _queue()
+    worker = ReportWorker(threads=1, job_timeout=3600)
+    worker._run(worker._claim_next())
+
+    AttendanceService().apply_bulk('update', ['U1'], START, status='Late')
+
+    fresh, reused = _queue()
+    assert not reused and fresh.id != report.id
+
+
+def test_evict_expired_reports(attendance):
+    report, _ = _queue()
+    worker = ReportWorker(threads=1, job_timeout=3600)
+    worker._run(worker._claim_next())
+    report = db.session.get(Report, report.id)
+    path = report.file_path
+    report.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    assert ReportService().evict_expired_reports() == 1
+    assert db.session.get(Report, report.id).file_path is None
+    assert not _queue()[1]
+    assert not os.path.exists(path)
+
+
+def test_failed_eviction_keeps_thread_count(app, attendance, monkeypatch):
+    worker = ReportWorker(threads=1, job_timeout=3600)
+
+    def fail():
+        raise OSError('disk gone')
+    monkeypatch.setattr(worker.report_service, 'evict_expired_reports', fail)
+
+    worker._active = 1
+    worker._drain(app)
+
+    assert worker._active == 0
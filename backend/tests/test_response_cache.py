@@ -0,0 +1,109 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models.user import User, UserRole
+from app.services.attendance_service import AttendanceService
+from app.utils.response_cache import date_tags, invalidate_dates_on_commit, response_cache
+
+
+@pytest.fixture
+def client(app, make_users, auth_headers):
+    response_cache.clear()
+    make_users(3)
+    db.session.get(User, 'U0').role = UserRole.ADMIN
+    db.session.commit()
+    client = app.test_client()
+    client.admin = auth_headers('U0')
+    client.employees = [auth_headers('U1'), auth_headers('U2')]
+    yield client
+    response_cache.clear()
+
+
+def _counts():
+    return response_cache.hits, response_cache.misses
+
+
+def test_employee_hit_skips_view_and_user_lookup(client):
+    first = client.get('/api/statistics/dashboard', headers=client.employees[0])
+    hits, misses = _counts()
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        second = client.get('/api/statistics/dashboard', headers=client.employees[0])
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert second.get_json() == first.get_json()
+    assert _counts() == (hits + 1, misses)
+    assert not [statement for statement in statements if 'FROM users' in statement]
+
+
+def test_admin_hit_shared_between_admins(client, auth_headers):
+    db.session.get(User, 'U2').role = UserRole.ADMIN
+    db.session.commit()
+    first = client.get('/api/statistics/dashboard', headers=client.admin).get_json()
+    hits, misses = _counts()
+
+    second = client.get('/api/statistics/dashboard', headers=auth_headers('U2')).get_json()
+
+    assert second == first
+    assert _counts() == (hits + 1, misses)
+
+
+def test_demoted_admin_not_served_admin_entry(client):
+    admin_response = client.get('/api/statistics/dashboard', headers=client.admin).get_json()
+    assert 'total_users' in admin_response
+
+    # The token still claims ADMIN
+    db.session.get(User, 'U0').role = UserRole.EMPLOYEE
+    db.session.commit()
+    response = client.get('/api/statistics/dashboard', headers=client.admin).get_json()
+
+    assert 'total_users' not in response
+    assert 'attendance_rate' in response
+
+
+def test_employees_do_not_share_entries(client):
+    AttendanceService().mark_attendance('U1')
+
+    first = client.get('/api/statistics/dashboard', headers=client.employees[0]).get_json()
+    second = client.get('/api/statistics/dashboard', headers=client.employees[1]).get_json()
+
+    assert first['today_status'] == 'Present'
+    assert second['today_status'] is None
+
+
+def test_attendance_commit_invalidates_dates(client):
+    before = client.get('/api/statistics/dashboard', headers=client.admin).get_json()
+
+    AttendanceService().mark_attendance('U1')
+    hits, misses = _counts()
+    after = client.get('/api/statistics/dashboard', headers=client.admin).get_json()
+
+    assert _counts() == (hits, misses + 1)
+    assert after['today_present'] == before['today_present'] + 1
+
+
+def test_invalidation_applies_only_after_commit(app):
+    tags = date_tags(date.today(), date.today())
+    versions = response_cache.backend.versions(tags)
+
+    # Writers queue dates inside their transaction
+    db.session.execute(db.select(User.id))
+    invalidate_dates_on_commit([date.today()])
+    assert response_cache.backend.versions(tags) == versions
+    db.session.rollback()
+    db.session.commit()
+    assert response_cache.backend.versions(tags) == versions
+
+    db.session.execute(db.select(User.id))
+    invalidate_dates_on_commit([date.today()])
+    db.session.commit()
+    assert response_cache.backend.versions(tags) == [version + 1 for version in versions]
@@ -186,23 +186,28 @@ CREATE TABLE departments (
 -- ============================================================================
 CREATE TABLE reports (
     id VARCHAR(50) PRIMARY KEY COMMENT 'Report ID',
-    user_id VARCHAR(20) NOT NULL COMMENT 'Who generated this report',
-    report_type VARCHAR(50) NOT NULL COMMENT 'Type of report (attendance, summary, etc)',
+    user_id VARCHAR(20) NOT NULL COMMENT 'Who requested this report',
+    report_type VARCHAR(50) NOT NULL COMMENT 'Type of report (attendance, users, departments)',
     title VARCHAR(255) NOT NULL COMMENT 'Report title',
     description TEXT COMMENT 'Report description',
-    start_date DATE COMMENT 'Report period start',
-    end_date DATE COMMENT 'Report period end',
-    filters JSON COMMENT 'Applied filters',
-    file_url VARCHAR(255) COMMENT 'Path to generated file',
+    filters JSON COMMENT 'Report period (start_date, end_date) and applied filters',
+    cache_key CHAR(64) COMMENT 'SHA-256 of type, normalized period/filters and data watermark',
+    file_path VARCHAR(255) COMMENT 'Path to generated file',
     file_size INT COMMENT 'File size in bytes',
-    format ENUM('csv', 'pdf', 'excel', 'json') DEFAULT 'csv' COMMENT 'Report format',
-    total_records INT COMMENT 'Total records in report',
-    generated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    file_format ENUM('csv', 'pdf', 'excel', 'parquet') NOT NULL DEFAULT 'csv' COMMENT 'Report format',
+    record_count INT COMMENT 'Total records in report',
+    status ENUM('pending', 'running', 'completed', 'failed') DEFAULT 'pending' COMMENT 'Job status (the table doubles as the report job queue)',
+    progress INT DEFAULT 0 COMMENT 'Percent done while RUNNING',
+    error_message TEXT COMMENT 'Why the job failed',
+    started_at DATETIME COMMENT 'When a worker claimed the job',
+    generated_at DATETIME COMMENT 'When the file was completed',
     expires_at DATETIME COMMENT 'When report file expires/deletes',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_user_id (user_id),
+    INDEX idx_status_created (status, created_at),
+    INDEX idx_cache_key (cache_key),
     INDEX idx_generated_at (generated_at),
     INDEX idx_report_type (report_type)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Generated reports metadata';
@@ -222,6 +227,11 @@ CREATE TABLE system_config (
     INDEX idx_updated_at (updated_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='System configuration settings';
 
+-- Cross-worker change counter for the in-process face gallery; seeded so
+-- concurrent first updates never race to create it
+INSERT INTO system_config (config_key, config_value, data_type, description) VALUES
+('face_gallery_version', '0', 'number', 'Incremented whenever verified face encodings change');
+
 -- ============================================================================
 -- TABLE 10: NOTIFICATIONS - Store user notifications
 -- ============================================================================
@@ -243,6 +253,36 @@ CREATE TABLE notifications (
     INDEX idx_created_at (created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='User notifications';
 
+-- ============================================================================
+-- TABLE 11: ATTENDANCE_DAILY_ROLLUP - Attendance counts per day/department/status
+-- ============================================================================
+CREATE TABLE attendance_daily_rollup (
+    date_only DATE NOT NULL COMMENT 'Attendance date',
+    department VARCHAR(50) NOT NULL DEFAULT '' COMMENT 'Department of the user when marked (empty = none)',
+    status ENUM('Present', 'Absent', 'Late', 'Leave') NOT NULL COMMENT 'Attendance status',
+    count INT NOT NULL DEFAULT 0 COMMENT 'Number of attendance records',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (date_only, department, status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Pre-aggregated attendance counts (maintained by AttendanceService)';
+
+-- ============================================================================
+-- TABLE 12: ATTENDANCE_MONTHLY_COUNTERS - Attendance counts per user/month
+-- ============================================================================
+CREATE TABLE attendance_monthly_counters (
+    user_id VARCHAR(20) NOT NULL COMMENT 'Reference to users table',
+    month_start DATE NOT NULL COMMENT 'First day of the month',
+    total_days INT NOT NULL DEFAULT 0 COMMENT 'Attendance records in the month',
+    present_days INT NOT NULL DEFAULT 0,
+    absent_days INT NOT NULL DEFAULT 0,
+    late_days INT NOT NULL DEFAULT 0,
+    leave_days INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (user_id, month_start),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Per-user monthly attendance counters (maintained by AttendanceService)';
+
 -- ============================================================================
 -- VIEWS FOR COMMON QUERIES
 -- ============================================================================